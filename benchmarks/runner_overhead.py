@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Measure the overhead junorunner's result and runner add to each test.
+
+Synthetic suites of trivial tests are run through unittest's stock
+TextTestRunner, which is what Django's DiscoverRunner uses, and through
+junorunner's TextTestRunner in each output mode: dots, verbose, JUnit XML
+and slow tests. The difference in time, divided by the number of tests,
+is the overhead per test. Each run is also repeated under tracemalloc
+(Python 3.4+) for its peak memory.
+
+Run it from anywhere; the log files and JUnit XML are written to a
+temporary directory::
+
+    $ python benchmarks/runner_overhead.py --sizes 1000 10000
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from junorunner.extended_runner import (
+    TextTestResult, TextTestRunner,
+)
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+TESTS_PER_CLASS = 100
+
+VARIANTS = {
+    # every test passes
+    'passing': 0,
+    # every other test fails, all at the same line but each with its own
+    # message, their tracebacks all formatted as the stock runner does
+    'failing': 2,
+}
+
+
+class BenchmarkTestResult(TextTestResult):
+    # grouping would spare junorunner formatting most of the tracebacks,
+    # which the stock runner can't do, whatever the settings say
+    GROUP_FAILURES = False
+
+
+class JUnitTestResult(BenchmarkTestResult):
+    JUNIT_FILE = 'junit.xml'
+
+
+# name -> (verbosity, junorunner TextTestRunner kwargs)
+MODES = (
+    ('dots', 1, {}),
+    ('verbose', 2, {}),
+    ('junit', 1, {'resultclass': JUnitTestResult}),
+    ('slow tests', 1, {'slow_test_count': 10}),
+)
+
+# marks an overhead below zero, which can only be noise
+NEGATIVE = '*'
+
+
+def make_test(index, fail_every):
+    if fail_every and index % fail_every == 0:
+        def test(self):
+            self.assertEqual(index, -1)
+    else:
+        def test(self):
+            pass
+    return test
+
+
+def make_suite(size, fail_every):
+    "Build a suite of size trivial tests, TESTS_PER_CLASS to a class."
+    suite = unittest.TestSuite()
+    for start in range(0, size, TESTS_PER_CLASS):
+        methods = dict(
+            (str('test_%06d' % index), make_test(index, fail_every))
+            for index in range(start, min(start + TESTS_PER_CLASS, size))
+        )
+        case = type(str('Synthetic%06d' % start), (unittest.TestCase,),
+                    methods)
+        suite.addTests(
+            case(name) for name in sorted(methods)
+        )
+    return suite
+
+
+def stock_runner(stream, verbosity, size):
+    return unittest.TextTestRunner(stream=stream, verbosity=verbosity)
+
+
+def juno_runner(stream, verbosity, size, resultclass=BenchmarkTestResult,
+                **kwargs):
+    return TextTestRunner(stream=stream, verbosity=verbosity,
+                          total_tests=size, resultclass=resultclass,
+                          **kwargs)
+
+
+def time_run(make_runner, size, fail_every, repeat):
+    """
+    Return the best of repeat timings of running a fresh suite, and the
+    peak memory traced while running one more, or None.
+    """
+    timings = []
+    with open(os.devnull, 'w') as stream:
+        for _ in range(repeat):
+            suite = make_suite(size, fail_every)
+            runner = make_runner(stream)
+            start = timeit.default_timer()
+            runner.run(suite)
+            timings.append(timeit.default_timer() - start)
+
+        peak = None
+        if tracemalloc is not None:
+            suite = make_suite(size, fail_every)
+            runner = make_runner(stream)
+            tracemalloc.start()
+            runner.run(suite)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def format_peak(peak):
+    return "-" if peak is None else "%.1f" % (peak / 1024.0 / 1024.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1000, 10000, 100000],
+                        help="The numbers of tests to run "
+                             "(default: 1000 10000 100000)")
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS),
+                        default=sorted(VARIANTS),
+                        help="Run suites where every test passes, and/or "
+                             "where every other test fails")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Take the best of this many runs (default: 3)")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='junorunner-benchmark-')
+    cwd = os.getcwd()
+    os.chdir(directory)
+    negative = False
+    try:
+        print("{0:>7} {1:<8} {2:<11} {3:>9} {4:>9} {5:>10} {6:>9} "
+              "{7:>9}".format("tests", "variant", "mode", "stock s",
+                              "juno s", "us/test", "stock MiB",
+                              "juno MiB"))
+        for size in args.sizes:
+            for variant in args.variants:
+                fail_every = VARIANTS[variant]
+                stock = {}
+                for name, verbosity, kwargs in MODES:
+                    if verbosity not in stock:
+                        stock[verbosity] = time_run(
+                            lambda stream: stock_runner(
+                                stream, verbosity, size),
+                            size, fail_every, args.repeat)
+                    stock_time, stock_peak = stock[verbosity]
+                    juno_time, juno_peak = time_run(
+                        lambda stream: juno_runner(
+                            stream, verbosity, size, **kwargs),
+                        size, fail_every, args.repeat)
+                    overhead = (juno_time - stock_time) / size * 1e6
+                    print("{0:>7} {1:<8} {2:<11} {3:>9.3f} {4:>9.3f} "
+                          "{5:>9.1f}{6:1} {7:>9} {8:>9}".format(
+                              size, variant, name, stock_time, juno_time,
+                              overhead, NEGATIVE if overhead < 0 else "",
+                              format_peak(stock_peak),
+                              format_peak(juno_peak)))
+                    sys.stdout.flush()
+                    negative = negative or overhead < 0
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    if negative:
+        print("%s junorunner came out faster than the stock runner, which "
+              "it can't be: the timings are too noisy to trust, so try "
+              "more --repeat or bigger --sizes" % NEGATIVE)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
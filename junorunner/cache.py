@@ -0,0 +1,124 @@
+"""
+Skip tests that passed last time when nothing they depend on has changed.
+
+A test's fingerprint is a hash of the contents of its own module and of
+every project file recorded as one of its dependencies (see
+dependencies.py). Tests with no recorded dependencies are never cached,
+as there is no telling what they use. Nor does the fingerprint cover
+settings, fixtures or anything else that isn't a Python module, which is
+why the cache is only used when asked for.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+
+from junorunner.dependencies import source_file
+
+
+class FileHasher(object):
+    """Hash file contents, reading each file at most once."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def __call__(self, path):
+        if path not in self.hashes:
+            try:
+                with open(path, 'rb') as source:
+                    self.hashes[path] = hashlib.sha1(source.read()).hexdigest()
+            except IOError:
+                # deleted files hash as missing, which is a change too
+                self.hashes[path] = 'missing'
+        return self.hashes[path]
+
+
+def module_file(test):
+    "Return the path to the source file of a test's module, if it has one."
+    path = source_file(sys.modules.get(test.__class__.__module__))
+    if path is None:
+        return None
+    return os.path.relpath(path)
+
+
+def test_fingerprint(test, dependencies, hash_file):
+    "Hash a test's module and its recorded dependencies together."
+    paths = set(dependencies)
+    path = module_file(test)
+    if path is not None:
+        paths.add(path)
+    fingerprint = hashlib.sha1()
+    for path in sorted(paths):
+        fingerprint.update(
+            ('%s:%s\n' % (path, hash_file(path))).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+class ResultCache(object):
+    """
+    The last outcome of each test and the fingerprint it had, keeping only
+    the ``size`` most recently used entries.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "test_id TEXT PRIMARY KEY, "
+                "fingerprint TEXT NOT NULL, "
+                "outcome TEXT NOT NULL, "
+                "used REAL NOT NULL)"
+            )
+
+    def passed(self, fingerprints):
+        """
+        Return the ids of the tests, from a dict of id -> fingerprint, that
+        passed last time with the same fingerprint.
+        """
+        cached = dict(
+            (test_id, fingerprint)
+            for test_id, fingerprint, outcome in self.connection.execute(
+                "SELECT test_id, fingerprint, outcome FROM results")
+            if outcome == 'success'
+        )
+        passed = set(
+            test_id for test_id, fingerprint in fingerprints.items()
+            if cached.get(test_id) == fingerprint
+        )
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE results SET used = ? WHERE test_id = ?",
+                ((now, test_id) for test_id in passed)
+            )
+        return passed
+
+    def record(self, outcomes, fingerprints):
+        """
+        Store the outcome of each test run, from a dict of id -> outcome,
+        with its fingerprint, then evict the least recently used entries
+        beyond the cache size.
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results "
+                "(test_id, fingerprint, outcome, used) VALUES (?, ?, ?, ?)",
+                ((test_id, fingerprints[test_id], outcome, now)
+                 for test_id, outcome in outcomes.items()
+                 if test_id in fingerprints)
+            )
+            self.connection.execute(
+                "DELETE FROM results WHERE test_id NOT IN ("
+                "SELECT test_id FROM results ORDER BY used DESC LIMIT ?)",
+                (self.size,)
+            )
+
+    def close(self):
+        self.connection.close()
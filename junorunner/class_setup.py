@@ -0,0 +1,149 @@
+"""
+Time the class-level setup and teardown of the tests, and their fixtures.
+
+A test's own timing runs from startTest to stopTest, which leaves out
+setUpClass and tearDownClass, and with them Django's setUpTestData and
+the loading of a TestCase's fixtures. Those are timed by wrapping the
+class methods of every TestCase class in the suite for the run, and the
+functions the loaddata command opens each fixture file with, a file being
+loaded until the next is opened or the label is done with. setUpTestData
+and fixtures are loaded within setUpClass, so setUpClass is timed less
+what they took, as each gets its own entry.
+"""
+from __future__ import unicode_literals
+
+import os
+import timeit
+from collections import defaultdict
+
+METHODS = ('setUpClass', 'setUpTestData', 'tearDownClass')
+
+
+def class_name(cls):
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def find_classmethod(cls, name):
+    "Return the function behind a class method, as inherited, or None."
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return getattr(klass.__dict__[name], '__func__', None)
+    return None
+
+
+class ClassSetupTimer(object):
+
+    def __init__(self):
+        # the total time of each class's setup and teardown methods, by
+        # "module.Class.method", and of each fixture file, with how often
+        # it was loaded
+        self.phase_times = defaultdict(float)
+        self.fixture_times = defaultdict(float)
+        self.fixture_loads = defaultdict(int)
+        # the setup times of each class not yet written to the JUnit XML
+        self.pending = defaultdict(list)
+        # [class, phase, start, time spent in nested phases] for each
+        # phase in progress
+        self.stack = []
+        self.installed = []
+        self.load_label = None
+
+    def install(self, classes):
+        "Wrap the setup and teardown methods of the given TestCase classes."
+        # find every original before wrapping any, so that a class isn't
+        # given its parent's wrapper to wrap again
+        for cls in classes:
+            for name in METHODS:
+                function = find_classmethod(cls, name)
+                if function is not None:
+                    self.installed.append(
+                        (cls, name, cls.__dict__.get(name), function))
+        for cls, name, _, function in self.installed:
+            setattr(cls, name, classmethod(self.timed(name, function)))
+
+        from django.core.management.commands import loaddata
+        # Django 1.6+ loads the fixtures one label at a time
+        if hasattr(loaddata.Command, 'load_label'):
+            self.load_label = loaddata.Command.load_label
+            loaddata.Command.load_label = self.timed_fixture(self.load_label)
+
+    def uninstall(self):
+        for cls, name, own, _ in self.installed:
+            if own is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, own)
+        self.installed = []
+
+        if self.load_label is not None:
+            from django.core.management.commands import loaddata
+            loaddata.Command.load_label = self.load_label
+            self.load_label = None
+
+    def timed(self, phase, function):
+        timer = self
+
+        def timed_method(cls):
+            if timer.stack and timer.stack[-1][:2] == [cls, phase]:
+                # an override calling up to the method it overrides
+                return function(cls)
+            timer.start(cls, phase)
+            try:
+                return function(cls)
+            finally:
+                timer.stop()
+        return timed_method
+
+    def timed_fixture(self, load_label):
+        timer = self
+
+        def timed_load_label(command, fixture_label, *args, **kwargs):
+            cls = timer.stack[-1][0] if timer.stack else None
+            depth = len(timer.stack)
+
+            def timed_open(open_method):
+                def timed_open_method(fixture_file, *args, **kwargs):
+                    if len(timer.stack) > depth:
+                        timer.stop()
+                    timer.start(
+                        cls, 'fixture %s' % os.path.relpath(fixture_file))
+                    return open_method(fixture_file, *args, **kwargs)
+                return timed_open_method
+
+            # one label can match several files, in different fixture
+            # directories or of different formats
+            formats = command.compression_formats
+            command.compression_formats = dict(
+                (name, (timed_open(open_method), mode))
+                for name, (open_method, mode) in formats.items()
+            )
+            try:
+                return load_label(command, fixture_label, *args, **kwargs)
+            finally:
+                if len(timer.stack) > depth:
+                    timer.stop()
+                command.compression_formats = formats
+        return timed_load_label
+
+    def start(self, cls, phase):
+        self.stack.append([cls, phase, timeit.default_timer(), 0.0])
+
+    def stop(self):
+        cls, phase, start, children = self.stack.pop()
+        elapsed = timeit.default_timer() - start
+        if self.stack:
+            self.stack[-1][3] += elapsed
+        self_time = elapsed - children
+
+        if phase.startswith('fixture '):
+            path = phase[len('fixture '):]
+            self.fixture_times[path] += self_time
+            self.fixture_loads[path] += 1
+        else:
+            self.phase_times['%s.%s' % (class_name(cls), phase)] += self_time
+        if cls is not None and phase != 'tearDownClass':
+            self.pending[class_name(cls)].append((phase, self_time))
+
+    def take(self, name):
+        "Return the (phase, time) pairs of a class not yet taken."
+        return self.pending.pop(name, [])
@@ -0,0 +1,96 @@
+"""
+Decide whether test databases kept from a previous run can be reused.
+
+Django's --keepdb reuses whatever test database it finds, however out of
+date its schema is. We fingerprint everything the schema is built from
+(the migration files, the model source and the database settings) and
+only let a kept database be reused when the fingerprint is unchanged.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import inspect
+import sqlite3
+import sys
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db.migrations.loader import MigrationLoader
+
+
+def schema_files():
+    "Return the source files of every model and migration in the project."
+    files = set()
+    for model in apps.get_models(include_auto_created=True):
+        path = inspect.getsourcefile(model)
+        if path is not None:
+            files.add(path)
+    loader = MigrationLoader(None)
+    for migration in loader.disk_migrations.values():
+        path = getattr(sys.modules.get(migration.__module__), '__file__', None)
+        if path is not None:
+            files.add(path)
+    return files
+
+
+def schema_fingerprint():
+    """
+    Hash the model and migration sources, the database settings and the
+    Django version, which between them decide what the test databases
+    look like.
+    """
+    fingerprint = hashlib.sha1()
+    fingerprint.update(repr(django.VERSION).encode('utf-8'))
+    fingerprint.update(
+        repr(sorted(
+            (alias, sorted((key, repr(value))
+                           for key, value in database.items()))
+            for alias, database in settings.DATABASES.items()
+        )).encode('utf-8')
+    )
+    for path in sorted(schema_files()):
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        fingerprint.update(path.encode('utf-8'))
+        try:
+            with open(path, 'rb') as source:
+                fingerprint.update(source.read())
+        except IOError:
+            pass
+    return fingerprint.hexdigest()
+
+
+class SchemaStore(object):
+    """
+    The fingerprint of the test databases left by the last run that built
+    them, and how long building them took.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS test_databases ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "fingerprint TEXT NOT NULL, "
+                "setup_time REAL NOT NULL)"
+            )
+
+    def get(self):
+        "Return (fingerprint, setup time) or (None, None)."
+        row = self.connection.execute(
+            "SELECT fingerprint, setup_time FROM test_databases").fetchone()
+        return row or (None, None)
+
+    def set(self, fingerprint, setup_time):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO test_databases "
+                "(id, fingerprint, setup_time) VALUES (0, ?, ?)",
+                (fingerprint, setup_time)
+            )
+
+    def close(self):
+        self.connection.close()
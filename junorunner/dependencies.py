@@ -0,0 +1,245 @@
+"""
+Work out which tests could be affected by a change.
+
+While recording, every test runs under a light profiling hook that notes
+the source files of the functions it calls. Code that only runs when a
+module is imported, such as the class bodies of models, is never called
+during a test, so each test also depends on the project modules its test
+module imports from, directly or through other project modules. The
+project files among them are stored against the test id, alongside the
+duration history, so that a later run can pick out just the tests that
+touched the files changed since a given git ref.
+"""
+from __future__ import unicode_literals
+
+import os
+import sqlite3
+import subprocess
+import sys
+import types
+
+from django.core.management.base import CommandError
+
+# SQLite's default limit on the number of parameters in a single query
+MAX_QUERY_PARAMETERS = 999
+
+# the runner's own code runs in and around every test
+RUNNER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def project_file(path, root):
+    """
+    Return the path relative to the project root, or None if it is not a
+    project source file.
+    """
+    # code compiled from strings and frozen modules has names like
+    # "<string>", and files can have been deleted since they were imported
+    if path.startswith('<') or not os.path.isfile(path):
+        return None
+    path = os.path.abspath(path)
+    if not path.startswith(root + os.sep):
+        return None
+    if path.startswith(RUNNER_DIRECTORY + os.sep):
+        return None
+    relative = path[len(root) + 1:]
+    if 'site-packages' in relative.split(os.sep):
+        return None
+    return relative
+
+
+def source_file(module):
+    "Return the path to a module's source file, or None if it has none."
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+    if path.endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    return path
+
+
+def referenced_modules(module):
+    """
+    Return the names of the modules a module's globals come from: those
+    imported into it and those defining the classes, functions and other
+    objects imported from them, with the packages they are in. A package's
+    own submodules are left out, as importing one sets it as an attribute
+    of the package whether or not the package uses it.
+    """
+    names = set()
+    package = module.__name__ + '.'
+    for value in list(vars(module).values()):
+        if isinstance(value, types.ModuleType):
+            name = value.__name__
+            if hasattr(module, '__path__') and name.startswith(package):
+                continue
+        else:
+            try:
+                name = getattr(value, '__module__', None)
+            except Exception:
+                # lazy objects and proxies can raise anything
+                continue
+            if not isinstance(name, type(module.__name__)):
+                continue
+        names.add(name)
+        while '.' in name:
+            name = name.rsplit('.', 1)[0]
+            names.add(name)
+    return names
+
+
+def imported_files(name, root):
+    """
+    Return the project files of an imported module and of the project
+    modules it imports from, following the imports through project modules
+    only, relative to the project root.
+    """
+    files = set()
+    seen = set([name])
+    pending = [name]
+    while pending:
+        module = sys.modules.get(pending.pop())
+        path = source_file(module)
+        relative = None
+        if path is not None:
+            relative = project_file(path, root)
+        if relative is None:
+            continue
+        files.add(relative)
+        for imported in referenced_modules(module) - seen:
+            seen.add(imported)
+            pending.append(imported)
+    return files
+
+
+class DependencyTracer(object):
+    """
+    Collect the files of every function called between start and stop, and
+    of the project modules a test module imports from.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.getcwd())
+        self.files = set()
+        # module name -> the project files it imports from
+        self.module_files = {}
+
+    def _profile(self, frame, event, arg):
+        if event == 'call':
+            self.files.add(frame.f_code.co_filename)
+
+    def start(self):
+        self.files = set()
+        sys.setprofile(self._profile)
+
+    def stop(self, module=None):
+        """
+        Stop collecting and return the project files that were used, along
+        with those the named module imports from.
+        """
+        sys.setprofile(None)
+        files = set()
+        for path in self.files:
+            relative = project_file(path, self.root)
+            if relative is not None:
+                files.add(relative)
+        if module is not None:
+            files.update(self.module_dependencies(module))
+        return files
+
+    def module_dependencies(self, name):
+        if name not in self.module_files:
+            self.module_files[name] = imported_files(name, self.root)
+        return self.module_files[name]
+
+
+class DependencyMap(object):
+    """The project files each test was seen to use, keyed by test id."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS dependencies ("
+                "test_id TEXT NOT NULL, "
+                "path TEXT NOT NULL, "
+                "PRIMARY KEY (test_id, path))"
+            )
+
+    def record(self, dependencies):
+        "Replace the files stored for each test in a dict of id -> files."
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM dependencies WHERE test_id = ?",
+                ((test_id,) for test_id in dependencies)
+            )
+            self.connection.executemany(
+                "INSERT INTO dependencies (test_id, path) VALUES (?, ?)",
+                ((test_id, path)
+                 for test_id, paths in dependencies.items()
+                 for path in paths)
+            )
+
+    def recorded_tests(self):
+        return set(
+            test_id for test_id, in self.connection.execute(
+                "SELECT DISTINCT test_id FROM dependencies")
+        )
+
+    def dependencies(self):
+        "Return a dict of test id -> the set of files it depends on."
+        dependencies = {}
+        for test_id, path in self.connection.execute(
+                "SELECT test_id, path FROM dependencies"):
+            dependencies.setdefault(test_id, set()).add(path)
+        return dependencies
+
+    def recorded_files(self, paths):
+        "Return those of the given paths that any test depends on."
+        return self._select('path', paths)
+
+    def tests_using(self, paths):
+        "Return the ids of the tests that depend on any of the paths."
+        return self._select('test_id', paths)
+
+    def _select(self, column, paths):
+        paths = list(paths)
+        found = set()
+        for start in range(0, len(paths), MAX_QUERY_PARAMETERS):
+            chunk = paths[start:start + MAX_QUERY_PARAMETERS]
+            found.update(
+                value for value, in self.connection.execute(
+                    "SELECT DISTINCT %s FROM dependencies WHERE path IN (%s)"
+                    % (column, ', '.join('?' * len(chunk))),
+                    chunk
+                )
+            )
+        return found
+
+    def close(self):
+        self.connection.close()
+
+
+def changed_files(ref):
+    """
+    Return the files that differ between the working tree and the given
+    git ref, relative to the current directory.
+    """
+    try:
+        output = subprocess.check_output(
+            ['git', 'diff', '--name-only', '--relative', ref],
+            stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as error:
+        # the first line of git's complaint says what was wrong with the
+        # ref, or that this isn't a repository
+        lines = (getattr(error, 'stderr', None) or b'').decode(
+            'utf-8', 'replace').strip().splitlines()
+        raise CommandError("Can't list the files changed since %s: %s" % (
+            ref, lines[0] if lines else error))
+    except OSError as error:
+        raise CommandError("Can't run git to list the files changed since "
+                           "%s: %s" % (ref, error))
+    return set(
+        os.path.normpath(line)
+        for line in output.decode('utf-8').splitlines() if line
+    )
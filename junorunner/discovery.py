@@ -0,0 +1,146 @@
+"""
+An index of the tests in each test file, to save importing them all.
+
+Discovery has to import every test module to find out what is in it, and
+on a large project that can take longer than the tests selected. The index
+records the ids of the tests each file held when it was last imported,
+along with the modification time and a hash of the contents of the file
+and of every project module it imports from, as a test class can inherit
+its tests from a mixin elsewhere. While none of those files has changed,
+its entry is good enough to leave the file out of a run whose test name
+patterns (-k) match none of its tests, or to list its tests without
+importing it at all.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import re
+import sqlite3
+from fnmatch import fnmatch, fnmatchcase
+
+# the test files unittest's discovery will import
+VALID_MODULE_NAME = re.compile(r'[_a-z]\w*\.py$', re.IGNORECASE)
+
+
+def find_top_level(directory):
+    "Return the directory above the package the given directory is in."
+    directory = os.path.abspath(directory)
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory = os.path.dirname(directory)
+    return directory
+
+
+def module_name(path, top_level_dir):
+    relative_path = os.path.relpath(os.path.splitext(path)[0], top_level_dir)
+    return relative_path.replace(os.path.sep, '.')
+
+
+def is_test_file(name, pattern):
+    return bool(VALID_MODULE_NAME.match(name)) and fnmatch(name, pattern)
+
+
+def matching(test_ids, patterns):
+    "Return the test ids matching any of the patterns, or all without any."
+    if not patterns:
+        return list(test_ids)
+    return [
+        test_id for test_id in test_ids
+        if any(fnmatchcase(test_id, pattern) for pattern in patterns)
+    ]
+
+
+def file_hash(path):
+    with open(path, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()
+
+
+def file_state(path):
+    "Return the modification time and hash of a file, as the index keeps."
+    return os.path.getmtime(path), file_hash(path)
+
+
+def unchanged(path, mtime, recorded_hash):
+    """
+    Tell whether a file is as recorded, hashing it only if its modification
+    time has changed.
+    """
+    try:
+        return (os.path.getmtime(path) == mtime or
+                file_hash(path) == recorded_hash)
+    except (IOError, OSError):
+        # deleted
+        return False
+
+
+class DiscoveryIndex(object):
+    """
+    The ids of the tests in each test file, keyed by relative path, with
+    the state of the files it imports from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            columns = [
+                row[1] for row in self.connection.execute(
+                    "PRAGMA table_info(test_files)")
+            ]
+            if columns and 'dependencies' not in columns:
+                # from before the imported files were recorded
+                self.connection.execute("DROP TABLE test_files")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS test_files ("
+                "path TEXT PRIMARY KEY, "
+                "mtime REAL NOT NULL, "
+                "hash TEXT NOT NULL, "
+                "test_ids TEXT NOT NULL, "
+                "dependencies TEXT NOT NULL)"
+            )
+
+    def test_ids(self, path):
+        """
+        Return the ids of the tests in a file, or None if the file or any
+        of the files it imports from have changed since they were recorded.
+        Only files whose modification time has changed are hashed.
+        """
+        row = self.connection.execute(
+            "SELECT mtime, hash, test_ids, dependencies FROM test_files "
+            "WHERE path = ?",
+            (os.path.relpath(path),)
+        ).fetchone()
+        if row is None:
+            return None
+        mtime, recorded_hash, test_ids, dependencies = row
+        if not unchanged(path, mtime, recorded_hash):
+            return None
+        # a line of "mtime hash path" for each file
+        for line in dependencies.splitlines():
+            dependency_mtime, dependency_hash, dependency = line.split(' ', 2)
+            if not unchanged(dependency, float(dependency_mtime),
+                             dependency_hash):
+                return None
+        return test_ids.split('\n') if test_ids else []
+
+    def record(self, path, test_ids, dependencies=()):
+        """
+        Store the ids of the tests in a file, and the state of the file and
+        of the given files it imports from.
+        """
+        states = []
+        for dependency in sorted(dependencies):
+            dependency = os.path.relpath(dependency)
+            states.append('%r %s %s' % (
+                file_state(dependency) + (dependency,)))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO test_files "
+                "(path, mtime, hash, test_ids, dependencies) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (os.path.relpath(path),) + file_state(path) +
+                ('\n'.join(test_ids), '\n'.join(states))
+            )
+
+    def close(self):
+        self.connection.close()
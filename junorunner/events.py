@@ -0,0 +1,55 @@
+"""
+A machine-readable log of the test run, one JSON object per line.
+
+Lines are buffered and written out by a background thread every
+``flush_interval`` seconds, so tailing the log costs the run next to
+nothing, and yet the startTest line of a test that hangs still reaches
+the file. Errors and failures are written out at once, as the process
+may not live to the next flush.
+"""
+from __future__ import unicode_literals
+
+import io
+import json
+import threading
+
+# the outcomes written out as soon as they happen
+URGENT_OUTCOMES = ('error', 'failure')
+
+
+class EventLog(object):
+
+    def __init__(self, path, flush_interval=1.0):
+        self.file = io.open(path, 'w', encoding='utf-8')
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, event, **fields):
+        fields['event'] = event
+        line = json.dumps(fields, sort_keys=True)
+        with self.lock:
+            self.buffer.append(line)
+        if fields.get('outcome') in URGENT_OUTCOMES:
+            self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                self.file.write('\n'.join(self.buffer) + '\n')
+                self.buffer = []
+            self.file.flush()
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        self.file.close()
@@ -7,12 +7,24 @@ Also adds in output colouring to make results easier to scan.
 """
 from __future__ import unicode_literals
 
+import heapq
+import re
 import sys
 import time
 import unittest
 import colorama
+from collections import defaultdict
 from importlib import import_module
 
+from junorunner.events import EventLog
+from junorunner.failures import (
+    FailureGroup, exception_line, failure_signature,
+)
+from junorunner.flaky import passes_on_retry, retried_test
+from junorunner.junit import JUnitWriter
+from junorunner.memory import format_size
+from junorunner.status import StatusLine
+
 try:
     # Django 1.6
     from django.utils.unittest import result
@@ -32,6 +44,10 @@ __unittest = True
 
 colorama.init()
 
+# what unittest reports errors in class and module fixtures against, as in
+# "tearDownClass (module.Class)"
+FIXTURE_ERROR = re.compile(r'^\w+ \((.+)\)$')
+
 SET_ERROR_TEXT = colorama.Fore.RED
 SET_PASS_TEXT = colorama.Fore.GREEN
 SET_FAILURE_TEXT = colorama.Fore.YELLOW
@@ -66,6 +82,60 @@ class _WritelnDecorator(object):
         self.write('\n')  # text-mode streams translate to \r\n if needed
 
 
+def iter_tests(suite):
+    """
+    Yield every individual test in a (possibly nested, possibly parallel)
+    test suite.
+    """
+    for test in getattr(suite, 'subsuites', suite):
+        if isinstance(test, unittest.TestSuite):
+            for subtest in iter_tests(test):
+                yield subtest
+        else:
+            yield test
+
+
+def push_bounded(heap, item, size):
+    """
+    Push an item onto a min-heap that keeps only the ``size`` largest
+    items it has been given.
+    """
+    if len(heap) < size:
+        heapq.heappush(heap, item)
+    elif heap[0] < item:
+        heapq.heapreplace(heap, item)
+
+
+def affected_test_ids(test, test_ids):
+    """
+    Return the ids, out of those given, of the tests an outcome reported
+    against a test belongs to: a subTest's parent, or all of the tests in
+    the class or module whose setUpClass, tearDownModule or the like it was
+    reported against.
+    """
+    test = retried_test(test)
+    if not hasattr(test, '_testMethodName'):
+        match = FIXTURE_ERROR.match(test.id())
+        if match is not None:
+            prefix = match.group(1) + '.'
+            return [test_id for test_id in test_ids
+                    if test_id.startswith(prefix)]
+    return [test.id()] if test.id() in test_ids else []
+
+
+class SlowTest(object):
+    """A single timing entry, ordered by elapsed time for use in a heap."""
+    __slots__ = ('elapsed', 'name', 'profile')
+
+    def __init__(self, elapsed, name, profile=None):
+        self.elapsed = elapsed
+        self.name = name
+        self.profile = profile
+
+    def __lt__(self, other):
+        return self.elapsed < other.elapsed
+
+
 class TextTestResult(result.TestResult):
     """A test result class that can print formatted text results to a stream.
 
@@ -74,8 +144,6 @@ class TextTestResult(result.TestResult):
     separator1 = '=' * 70
     separator2 = '-' * 70
 
-    slow_tests = []
-
     RERUN_LOG_FILE_NAME = getattr(
         settings,
         "TEST_RUNNER_RERUN_LOG_FILE_NAME",
@@ -95,9 +163,42 @@ class TextTestResult(result.TestResult):
         settings,
         'TEST_RUNNER_JUNIT_XML',
         None)
+    JUNIT_XML_INTERVAL = getattr(
+        settings,
+        'TEST_RUNNER_JUNIT_XML_INTERVAL',
+        1.0)
+    EVENT_LOG_FILE_NAME = getattr(
+        settings,
+        'TEST_RUNNER_EVENT_LOG_FILE_NAME',
+        None)
+    STATUS_LINE = getattr(
+        settings,
+        'TEST_RUNNER_STATUS_LINE',
+        True)
+    STATUS_LINE_INTERVAL = getattr(
+        settings,
+        'TEST_RUNNER_STATUS_LINE_INTERVAL',
+        0.2)
+    GROUP_FAILURES = getattr(
+        settings,
+        'TEST_RUNNER_GROUP_FAILURES',
+        False)
+    FAILURE_SIGNATURE_DEPTH = getattr(
+        settings,
+        'TEST_RUNNER_FAILURE_SIGNATURE_DEPTH',
+        3)
+
+    # the parallel worker the events being reported came from, 0 being
+    # this process
+    worker_id = 0
 
     def __init__(self, stream, descriptions, verbosity,
-                 total_tests=None, slow_test_count=10):
+                 total_tests=None, slow_test_count=10,
+                 expected_durations=None, partitions=None,
+                 dependency_tracer=None, cached_count=0,
+                 query_recorder=None, memory_profiler=None,
+                 slow_test_profiler=None, retries=0, baseline=None,
+                 setup_timer=None):
         super(TextTestResult, self).__init__()
         self.stream = stream
         self.showAll = verbosity > 1
@@ -114,30 +215,139 @@ class TextTestResult(result.TestResult):
         self.current_test_number = 1
         self.slow_test_count = slow_test_count
 
+        # min-heap of the slowest tests seen so far, never longer than
+        # slow_test_count, plus the aggregated time per class and module
+        self._slow_tests = []
+        self.class_times = defaultdict(float)
+        self.module_times = defaultdict(float)
+
+        # durations of the tests run so far, to be stored in the history,
+        # and what the history says the remaining tests will take
+        self.durations = {}
+        self.expected_durations = expected_durations
+        if expected_durations is not None:
+            self._expected_remaining = sum(expected_durations.values())
+            self._unseen_remaining = total_tests - len(expected_durations)
+            self._unseen_elapsed = 0.0
+            self._unseen_run = 0
+
+        # the parallel sub-suites, if any, timed by when their last test
+        # is reported back to us
+        self.partitions = partitions or []
+        self._partition_ends = dict(
+            (partition.tests[-1].id(), partition)
+            for partition in self.partitions
+        )
+
+        # the project files used by each test, when recording them
+        self.dependency_tracer = dependency_tracer
+        self.dependencies = {}
+
+        # tests left out of the run because they passed last time and
+        # nothing they use has changed since
+        self.cached_count = cached_count
+
+        # the query count and database time of every test, when counting
+        # them, and a min-heap of the tests that made the most queries
+        self.query_recorder = query_recorder
+        self.query_counts = {}
+        self._most_queries = []
+
+        # the memory used by each test, when profiling it: min-heaps of
+        # (bytes, test id, stats) for the tests that kept hold of the most
+        # memory and grew the RSS the most, plus the total kept per module
+        self.memory_profiler = memory_profiler
+        self._most_retained = []
+        self._most_rss_growth = []
+        self.module_retained = defaultdict(int)
+
+        # profiles each test, keeping the profiles of the slowest ones
+        # with their entries in the slow test heap
+        self.slow_test_profiler = slow_test_profiler
+
+        # times the class-level setup and teardown, and the fixtures,
+        # which happen outside of any one test
+        self.setup_timer = setup_timer
+
+        # how many times to run each failed test again once the run is
+        # over, the (test, err) of those that then passed, and meanwhile
+        # the JUnit elements of the failures, which are only written once
+        # it is known whether they were flaky
+        self.retries = retries
+        self.flaky = []
+        self._held_testcases = []
+
+        # the median durations of the tests on previous runs, and the tests
+        # that ran too much slower than that
+        self.baseline = baseline
+        self.regressions = []
+
+        # errors and failures grouped by the signature of their traceback,
+        # keeping the group of the first test to fail with each, and the
+        # ids of the tests that failed the same way after it, whose
+        # tracebacks are never formatted; plus the last traceback
+        # formatted, which is shown, logged and written more than once
+        self.failure_groups = {}
+        self._group_leaders = {}
+        self._grouped_failures = set()
+        self._formatted = (None, None, None)
+
+        # at --verbosity=2 on a terminal, a status line redrawn in place
+        # stands in for the lines written for every test, which are then
+        # only written for errors and failures
+        self.status_line = None
+        self.current_test = None
+        if self.showAll and self.STATUS_LINE and StatusLine.supported(stream):
+            self.showAll = False
+            self.status_line = StatusLine(
+                stream, self._status, self.STATUS_LINE_INTERVAL)
+
+        self.event_log = None
         self.openLogFiles()
 
     def startTestRun(self):
         super(TextTestResult, self).startTestRun()
-        self.start_time = time.time()
+        self.start_time = self.test_start_time = time.time()
 
         if self.createJunitXml:
-            self.tree = self.ETree.Element('testsuite')
+            self.junit = JUnitWriter(
+                self.JUNIT_FILE, 'Django Project Tests',
+                self.JUNIT_XML_INTERVAL)
+            # a test can write more than one <testcase>, one for each of
+            # its failing subtests, and errors in setUpClass write one for
+            # no test at all, so count the elements rather than the tests
+            self.junit_testcases = 0
+
+        if self.event_log is not None:
+            self.event_log.write(
+                'startTestRun', time=self.start_time, tests=self.total_tests)
+
+        if self.memory_profiler is not None:
+            self.memory_profiler.start_run()
+
+        if self.status_line is not None:
+            self.status_line.start()
 
     def openLogFiles(self):
         self.rerun_log_file = open(self.RERUN_LOG_FILE_NAME, "w+")
         if self.current_test_number == 1:
             self.rerun_log_file.truncate()  # zero previous content
         self.rerun_log_stream = _WritelnDecorator(self.rerun_log_file)
+        self._last_rerun = None
 
         self.error_log_file = open(self.FAILURE_LIST_FILENAME, "w+")
         if self.current_test_number == 1:
             self.error_log_file.truncate()  # zero previous content
         self.error_log_stream = _WritelnDecorator(self.error_log_file)
 
+        if self.EVENT_LOG_FILE_NAME is not None:
+            self.event_log = EventLog(self.EVENT_LOG_FILE_NAME)
+
     def closeLogFiles(self):
         for _file in [
             self.rerun_log_file,
-            self.error_log_file
+            self.error_log_file,
+            self.event_log,
         ]:
             try:
                 _file.close()
@@ -158,13 +368,17 @@ class TextTestResult(result.TestResult):
         Turn the descriptors for a failed test into a string that can
         be used to re-run the test later.
         """
+        # a failing subtest means running its whole test again
+        errorholder = retried_test(errorholder)
         if hasattr(errorholder, "_testMethodName"):
             incantation_string = "%s.%s.%s" % (
                 errorholder.__module__,
                 errorholder.__class__.__name__,
                 errorholder._testMethodName,
             )
-            self.rerun_log_stream.writeln(incantation_string)
+            if incantation_string != self._last_rerun:
+                self.rerun_log_stream.writeln(incantation_string)
+                self._last_rerun = incantation_string
         else:
             self.addtoErrorLog(
                 errorholder,
@@ -174,6 +388,36 @@ class TextTestResult(result.TestResult):
                 )
             )
 
+    def logOutcome(self, test, outcome, err=None, reason=None):
+        """
+        Record the outcome of a test in the event log, if there is one, to
+        be repeated when the test stops.
+        """
+        if self.event_log is None:
+            return
+        fields = {}
+        case = retried_test(test)
+        if case is not test:
+            # a failing subtest fails its test, unless another of its
+            # subtests already had an error
+            fields['subtest'] = test._subDescription()
+            if self.current_outcome != 'error':
+                self.current_outcome = outcome
+        else:
+            self.current_outcome = outcome
+        if err is not None:
+            fields['traceback'] = self._exc_info_to_string(err, test)
+        if reason is not None:
+            fields['reason'] = reason
+        self.event_log.write(
+            'outcome',
+            test=case.id(),
+            outcome=outcome,
+            time=time.time(),
+            worker=self.worker_id,
+            **fields
+        )
+
     def getDescription(self, test):
         doc_first_line = test.shortDescription()
         if self.descriptions and doc_first_line:
@@ -184,13 +428,38 @@ class TextTestResult(result.TestResult):
     def format_time(self, time):
         return ("%02d:%02d:%02d" % (time//3600, time//60, time % 60))
 
+    def format_precise_time(self, time):
+        "format_time to the millisecond, for what usually takes less."
+        return "%s.%03d" % (self.format_time(time), time * 1000 % 1000)
+
     @property
     def _elapsed_time(self):
         return time.time() - self.start_time
 
     @property
     def _estimated_time(self):
-        "Calculate and estimated time to complete the test run."
+        """
+        Calculate an estimated time to complete the test run.
+
+        Tests with a recorded duration are expected to take that long
+        again; tests never seen before are assumed to take as long as the
+        average unseen test has so far.
+        """
+        if self.expected_durations is None:
+            return self._extrapolated_time
+
+        if self._unseen_run:
+            average = self._unseen_elapsed / self._unseen_run
+        else:
+            average = self._elapsed_time / max(self.testsRun, 1)
+        return (
+            max(self._expected_remaining, 0) +
+            max(self._unseen_remaining, 0) * average
+        )
+
+    @property
+    def _extrapolated_time(self):
+        "Scale the elapsed time by the proportion of tests left to run."
         elapsed = self._elapsed_time
         factor = float(self.total_tests) / float(self.current_test_number)
         if self.current_test_number > self.total_tests:
@@ -207,6 +476,7 @@ class TextTestResult(result.TestResult):
                 "%(fail_colour)s Failures: %(fail_count)i%(clear)s, "
                 " Skipped: %(skip_count)i, "
                 "%(pass_colour)s Passed: %(pass_count)i %(clear)s"
+                "%(flaky)s%(cached)s"
             ) % {
                 'error_colour': SET_ERROR_TEXT,
                 'fail_colour': SET_FAILURE_TEXT,
@@ -215,30 +485,219 @@ class TextTestResult(result.TestResult):
                 'error_count': len(self.errors),
                 'fail_count': len(self.failures),
                 'skip_count': len(self.skipped),
+                'flaky': (
+                    ",  Flaky: %i" % self.flaky_count if self.flaky else ""
+                ),
+                'cached': (
+                    ",  Cached: %i" % self.cached_count
+                    if self.cached_count else ""
+                ),
                 'pass_count': (
-                    self.current_test_number -
+                    self.testsRun -
                     len(self.errors) -
                     len(self.failures) -
-                    len(self.skipped) -
-                    1  # to account for the += 1 in startTest
+                    len(self.skipped)
                 )
             }
         )
 
+    def _status(self):
+        "Return the progress of the run as the status line shows it."
+        return (
+            "[%04d/%04d] Elapsed: %s; Remaining: %s; Errors: %i, "
+            "Failures: %i, Skipped: %i; %s" % (
+                self.testsRun,
+                self.total_tests,
+                self.format_time(self._elapsed_time),
+                self.format_time(self._estimated_time),
+                len(self.errors),
+                len(self.failures),
+                len(self.skipped),
+                self.current_test or ""
+            )
+        )
+
+    @property
+    def slow_tests(self):
+        "The slowest tests of the run, slowest first."
+        return sorted(self._slow_tests, reverse=True)
+
+    @property
+    def slow_classes(self):
+        "The slowest TestCase classes of the run, slowest first."
+        return self._slowest(self.class_times)
+
+    @property
+    def slow_modules(self):
+        "The slowest test modules of the run, slowest first."
+        return self._slowest(self.module_times)
+
+    @property
+    def slow_class_setup(self):
+        "The slowest class setup and teardown methods, slowest first."
+        if self.setup_timer is None:
+            return []
+        return self._slowest(self.setup_timer.phase_times)
+
+    @property
+    def slow_fixtures(self):
+        "The fixtures that took longest to load in all, slowest first."
+        if self.setup_timer is None:
+            return []
+        loads = self.setup_timer.fixture_loads
+        return self._slowest(dict(
+            ("%s (%i loads)" % (label, loads[label]), elapsed)
+            for label, elapsed in self.setup_timer.fixture_times.items()
+        ))
+
+    def _slowest(self, times):
+        return heapq.nlargest(
+            self.slow_test_count,
+            (SlowTest(elapsed, name) for name, elapsed in times.items())
+        )
+
+    def _record_timing(self, test, elapsed, profile=None):
+        """
+        Keep the slowest slow_test_count tests in a bounded heap, so each
+        test costs O(log n) instead of re-sorting the whole list.
+        """
+        push_bounded(self._slow_tests, SlowTest(elapsed, test.id(), profile),
+                     self.slow_test_count)
+
+        self.class_times['%s.%s' % (test.__module__,
+                                    test.__class__.__name__)] += elapsed
+        self.module_times[test.__module__] += elapsed
+
+    def outcomes(self):
+        "Return a dict of test id -> outcome for every test that has run."
+        outcomes = dict.fromkeys(self.durations, 'success')
+        # errors and failures last, so that they win over the outcomes of
+        # a test's other subTests and of the other tests in its class
+        for outcome, tests in (
+            ('skip', [test for test, _ in self.skipped]),
+            ('expected failure',
+             [test for test, _ in self.expectedFailures]),
+            ('unexpected success', self.unexpectedSuccesses),
+            ('flaky', [test for test, _ in self.flaky]),
+            ('failure', [test for test, _ in self.failures]),
+            ('error', [test for test, _ in self.errors]),
+        ):
+            for test in tests:
+                for test_id in affected_test_ids(test, outcomes):
+                    outcomes[test_id] = outcome
+        return outcomes
+
+    @property
+    def flaky_count(self):
+        "How many tests were flaky, counting each test's subTests once."
+        return len(set(retried_test(test).id() for test, _ in self.flaky))
+
+    @property
+    def report_count(self):
+        "How many tests to list in each of the reports after the run."
+        return self.slow_test_count or 10
+
+    @property
+    def most_retained(self):
+        "The tests that kept hold of the most memory, most first."
+        return [stats for _, _, stats in sorted(self._most_retained,
+                                                reverse=True)]
+
+    @property
+    def most_rss_growth(self):
+        "The tests after which the RSS grew the most, most first."
+        return [stats for _, _, stats in sorted(self._most_rss_growth,
+                                                reverse=True)]
+
+    @property
+    def modules_retained(self):
+        "The test modules whose tests kept hold of the most memory."
+        return heapq.nlargest(
+            self.report_count,
+            (item for item in self.module_retained.items() if item[1] > 0),
+            key=lambda item: item[1]
+        )
+
+    def _record_memory(self, test, stats):
+        if stats.retained > 0:
+            push_bounded(self._most_retained,
+                         (stats.retained, stats.name, stats),
+                         self.report_count)
+        if stats.rss_growth:
+            push_bounded(self._most_rss_growth,
+                         (stats.rss_growth, stats.name, stats),
+                         self.report_count)
+        self.module_retained[test.__module__] += stats.retained
+
+    @property
+    def most_queries(self):
+        "The tests that made the most queries, most first."
+        return sorted(self._most_queries, reverse=True)
+
+    def _record_queries(self, stats):
+        self.query_counts[stats.name] = (stats.count, stats.time)
+        if stats.count:
+            push_bounded(self._most_queries, stats, self.report_count)
+
+    def describe_queries(self, test_id):
+        "Summarise the queries a test made, if they were counted."
+        if test_id not in self.query_counts:
+            return ""
+        count, db_time = self.query_counts[test_id]
+        return " (%i queries, %.3fs in the database)" % (count, db_time)
+
+    def _update_estimate(self, test_id, elapsed):
+        expected = self.expected_durations.pop(test_id, None)
+        if expected is None:
+            self._unseen_remaining -= 1
+            self._unseen_elapsed += elapsed
+            self._unseen_run += 1
+        else:
+            self._expected_remaining -= expected
+
     def stopTest(self, test):
+        profile = None
+        if self.slow_test_profiler is not None:
+            profile = self.slow_test_profiler.stop()
+
+        if self.dependency_tracer is not None:
+            self.dependencies[test.id()] = self.dependency_tracer.stop(
+                test.__class__.__module__)
+
+        if self.query_recorder is not None:
+            self._record_queries(self.query_recorder.stop(test.id()))
+
+        if self.memory_profiler is not None:
+            self._record_memory(test, self.memory_profiler.stop(test.id()))
+
         super(TextTestResult, self).stopTest(test)
 
+        elapsed = time.time() - self.test_start_time
+        self.durations[test.id()] = elapsed
+
+        if self.expected_durations is not None:
+            self._update_estimate(test.id(), elapsed)
+
         if self.slow_test_count:
-            # sort the list, then only take the required number
-            elapsed = {
-                'name': test.id(),
-                'elapsed': time.time() - self.test_start_time
-            }
-            self.slow_tests.append(elapsed)
-            self.slow_tests = sorted(
-                self.slow_tests,
-                reverse=True,
-                key=lambda k: k['elapsed'])[:self.slow_test_count]
+            self._record_timing(test, elapsed, profile)
+
+        if self.baseline is not None:
+            regression = self.baseline.regression(test.id(), elapsed)
+            if regression is not None:
+                self.regressions.append(regression)
+
+        if test.id() in self._partition_ends:
+            self._partition_ends[test.id()].actual = self._elapsed_time
+
+        if self.event_log is not None:
+            self.event_log.write(
+                'stopTest',
+                test=test.id(),
+                outcome=self.current_outcome,
+                start=self.test_start_time,
+                end=self.test_start_time + elapsed,
+                worker=self.worker_id
+            )
 
         if self.showAll:
             self.stream.writeln(
@@ -256,6 +715,15 @@ class TextTestResult(result.TestResult):
         self.test_start_time = time.time()
         super(TextTestResult, self).startTest(test)
 
+        if self.event_log is not None:
+            self.current_outcome = None
+            self.event_log.write(
+                'startTest',
+                test=test.id(),
+                time=self.test_start_time,
+                worker=self.worker_id
+            )
+
         if self.showAll:
             self.stream.write(
                 "%s[%04d.. -> %04d]%s " % (
@@ -269,9 +737,25 @@ class TextTestResult(result.TestResult):
             self.stream.write(" ... ")
             self.stream.flush()
             self.current_test_number += 1
+        elif self.status_line is not None:
+            self.current_test = test.id()
+            self.current_test_number += 1
+
+        if self.dependency_tracer is not None:
+            self.dependency_tracer.start()
+
+        if self.query_recorder is not None:
+            self.query_recorder.start()
+
+        if self.memory_profiler is not None:
+            self.memory_profiler.start()
+
+        if self.slow_test_profiler is not None:
+            self.slow_test_profiler.start()
 
     def addSuccess(self, test):
         super(TextTestResult, self).addSuccess(test)
+        self.logOutcome(test, 'success')
         if self.showAll:
             self.stream.writeln(SET_OK_OUTPUT + " OK " + RESET_OUTPUT)
         elif self.dots:
@@ -279,22 +763,56 @@ class TextTestResult(result.TestResult):
             self.stream.flush()
 
         if self.createJunitXml:
-            self._make_testcase_element(test)
+            self._write_testcase(self._make_testcase_element(test))
+
+    def _exc_info_to_string(self, err, test):
+        "Format each error once, however many times it is reported."
+        if self._formatted[0] is not err[1] or self._formatted[1] is not test:
+            self._formatted = (
+                err[1], test,
+                super(TextTestResult, self)._exc_info_to_string(err, test))
+        return self._formatted[2]
+
+    def groupFailure(self, test, err):
+        """
+        Put an error or failure in the group for its signature. If it is
+        the first in its group, its traceback is formatted as usual; if
+        not, a pointer to the first, followed by its own exception and
+        message, stands in for its traceback from now on, wherever it is
+        shown, logged or kept.
+        """
+        if not self.GROUP_FAILURES:
+            return
+        signature = failure_signature(err, self.FAILURE_SIGNATURE_DEPTH)
+        group = self.failure_groups.get(signature)
+        if group is None:
+            self.failure_groups[signature] = group = FailureGroup(test.id())
+            self._group_leaders[id(test)] = group
+            return
+        group.count += 1
+        self._grouped_failures.add(id(test))
+        self._formatted = (
+            err[1], test,
+            "Same traceback as %s (%i tests so far)\n%s" % (
+                group.first, group.count, exception_line(err)))
 
     def addError(self, test, err):
+        self.groupFailure(test, err)
         super(TextTestResult, self).addError(test, err)
+        self.logOutcome(test, 'error', err=err)
         if self.showAll:
             self.stream.writeln(SET_ERROR_OUTPUT + " ERROR " + RESET_OUTPUT)
             # ALSO show the error as it happens
-            formatted_err = self._exc_info_to_string(err, test)
-            if self.IMMEDIATELY_SHOW_FAILS:
-                self.printSingleError(
-                    SET_ERROR_OUTPUT + " ERROR " +
-                    RESET_OUTPUT + " Immediate details",
-                    test,
-                    formatted_err
-                )
-            self.addtoErrorLog(test, formatted_err)
+            self.showImmediately(
+                SET_ERROR_OUTPUT + " ERROR " + RESET_OUTPUT, test, err)
+        elif self.status_line is not None:
+            with self.status_line.paused():
+                self.stream.writeln("%s ... %s" % (
+                    self.getDescription(test),
+                    SET_ERROR_OUTPUT + " ERROR " + RESET_OUTPUT
+                ))
+                self.showImmediately(
+                    SET_ERROR_OUTPUT + " ERROR " + RESET_OUTPUT, test, err)
         elif self.dots:
             self.stream.write(SET_ERROR_OUTPUT + 'E' + RESET_OUTPUT)
             self.stream.flush()
@@ -305,22 +823,26 @@ class TextTestResult(result.TestResult):
             testcase = self._make_testcase_element(test)
             test_result = self.ETree.SubElement(testcase, 'error')
             self._add_tb_to_test(test, test_result, err)
+            self._write_failed_testcase(test, testcase)
 
     def addFailure(self, test, err):
+        self.groupFailure(test, err)
         super(TextTestResult, self).addFailure(test, err)
+        self.logOutcome(test, 'failure', err=err)
 
         if self.showAll:
             self.stream.writeln(SET_FAIL_OUTPUT + " FAIL " + RESET_OUTPUT)
             # ALSO show the error as it happens
-            formatted_err = self._exc_info_to_string(err, test)
-            if self.IMMEDIATELY_SHOW_FAILS:
-                self.printSingleError(
-                    SET_FAIL_OUTPUT + " FAIL " +
-                    RESET_OUTPUT + " Immediate details",
-                    test,
-                    formatted_err
-                )
-            self.addtoErrorLog(test, formatted_err)
+            self.showImmediately(
+                SET_FAIL_OUTPUT + " FAIL " + RESET_OUTPUT, test, err)
+        elif self.status_line is not None:
+            with self.status_line.paused():
+                self.stream.writeln("%s ... %s" % (
+                    self.getDescription(test),
+                    SET_FAIL_OUTPUT + " FAIL " + RESET_OUTPUT
+                ))
+                self.showImmediately(
+                    SET_FAIL_OUTPUT + " FAIL " + RESET_OUTPUT, test, err)
         elif self.dots:
             self.stream.write(SET_FAIL_OUTPUT + 'F' + RESET_OUTPUT)
             self.stream.flush()
@@ -331,9 +853,24 @@ class TextTestResult(result.TestResult):
             testcase = self._make_testcase_element(test)
             test_result = self.ETree.SubElement(testcase, 'failure')
             self._add_tb_to_test(test, test_result, err)
+            self._write_failed_testcase(test, testcase)
+
+    def addSubTest(self, test, subtest, err):
+        """
+        Report a failing subtest as if it were a test of its own, which
+        unittest records among the errors and failures but doesn't pass
+        to addError or addFailure.
+        """
+        if err is None:
+            super(TextTestResult, self).addSubTest(test, subtest, err)
+        elif issubclass(err[0], test.failureException):
+            self.addFailure(subtest, err)
+        else:
+            self.addError(subtest, err)
 
     def addSkip(self, test, reason):
         super(TextTestResult, self).addSkip(test, reason)
+        self.logOutcome(test, 'skip', reason=reason)
         if self.showAll:
             self.stream.writeln("skipped %r" % (reason,))
         elif self.dots:
@@ -344,9 +881,11 @@ class TextTestResult(result.TestResult):
             testcase = self._make_testcase_element(test)
             test_result = self.ETree.SubElement(testcase, 'skipped')
             test_result.set('message', 'Test Skipped: %s' % reason)
+            self._write_testcase(testcase)
 
     def addExpectedFailure(self, test, err):
         super(TextTestResult, self).addExpectedFailure(test, err)
+        self.logOutcome(test, 'expected failure', err=err)
         if self.showAll:
             self.stream.writeln("expected failure")
         elif self.dots:
@@ -357,9 +896,11 @@ class TextTestResult(result.TestResult):
             testcase = self._make_testcase_element(test)
             test_result = self.ETree.SubElement(testcase, 'skipped')
             self._add_tb_to_test(test, test_result, err)
+            self._write_testcase(testcase)
 
     def addUnexpectedSuccess(self, test):
         super(TextTestResult, self).addUnexpectedSuccess(test)
+        self.logOutcome(test, 'unexpected success')
         if self.showAll:
             self.stream.writeln("unexpected success")
         elif self.dots:
@@ -370,16 +911,38 @@ class TextTestResult(result.TestResult):
             testcase = self._make_testcase_element(test)
             test_result = self.ETree.SubElement(testcase, 'skipped')
             test_result.set('message', 'Test Skipped: Unexpected Success')
+            self._write_testcase(testcase)
+
+    def showImmediately(self, flavour, test, err):
+        "Show an error or failure as it happens, and log it."
+        formatted_err = self._exc_info_to_string(err, test)
+        if self.IMMEDIATELY_SHOW_FAILS:
+            self.printSingleError(
+                flavour + " Immediate details",
+                test,
+                formatted_err
+            )
+        self.addtoErrorLog(test, formatted_err)
 
     def printErrors(self):
-        if self.dots or self.showAll:
+        if self.dots or self.showAll or self.status_line is not None:
             self.stream.writeln()
         self.printErrorList('ERROR', self.errors)
         self.printErrorList('FAIL', self.failures)
+        self.printErrorList('FLAKY', self.flaky)
 
     def printErrorList(self, flavour, errors):
         for test, err in errors:
+            if id(test) in self._grouped_failures:
+                continue
             self.printSingleError(flavour, test, err)
+            group = self._group_leaders.get(id(test))
+            if group is not None and group.count > 1:
+                self.stream.writeln(
+                    "... and %i more tests with the same traceback, "
+                    "listed in %s" % (group.count - 1,
+                                      self.RERUN_LOG_FILE_NAME))
+                self.stream.writeln()
 
     def printSingleError(self, flavour, test, err):
         self.stream.writeln(self.separator1)
@@ -392,28 +955,152 @@ class TextTestResult(result.TestResult):
     def stopTestRun(self):
         super(TextTestResult, self).stopTestRun()
 
-        if self.createJunitXml:
-            run_time_taken = time.time() - self.start_time
-            self.tree.set('name', 'Django Project Tests')
-            self.tree.set('errors', str(len(self.errors)))
-            self.tree.set('failures', str(len(self.failures)))
-            self.tree.set('skips', str(len(self.skipped)))
-            self.tree.set('tests', str(self.testsRun))
-            self.tree.set('time', "%.3f" % run_time_taken)
+        if self.status_line is not None:
+            self.status_line.stop()
 
-            output = self.ETree.ElementTree(self.tree)
-            output.write(self.JUNIT_FILE, encoding="utf-8")
+        if self.memory_profiler is not None:
+            self.memory_profiler.stop_run()
+
+        if self.retries:
+            self.retryFailures()
+
+        if self.createJunitXml:
+            self._write_held_testcases()
+            self.junit.close(**self._junit_counts())
+
+        if self.event_log is not None:
+            self.event_log.write(
+                'stopTestRun',
+                time=time.time(),
+                tests=self.testsRun,
+                errors=len(self.errors),
+                failures=len(self.failures),
+                skips=len(self.skipped)
+            )
 
         self.printErrors()
 
+    def retryFailures(self):
+        """
+        Run each test that failed or errored again on its own, and move
+        those that then pass from the errors and failures to the flaky
+        tests, leaving only the consistently failing ones.
+        """
+        failed = self.errors + self.failures
+        if not failed:
+            return
+        self.stream.writeln()
+        self.stream.writeln(
+            "Retrying the failed tests, up to %i time%s each" % (
+                self.retries, self.retries != 1 and "s" or ""))
+        passed = {}
+        for test, _ in failed:
+            test_id = retried_test(test).id()
+            if test_id in passed:
+                continue
+            passed[test_id] = passes_on_retry(test, self.retries)
+            if passed[test_id]:
+                self.stream.writeln("%s ... flaky, passed on retry %i" % (
+                    test_id, passed[test_id]))
+            else:
+                self.stream.writeln("%s ... %s" % (
+                    test_id,
+                    SET_FAIL_OUTPUT + " FAILED AGAIN " + RESET_OUTPUT))
+
+        for outcomes in (self.errors, self.failures):
+            self.flaky.extend(
+                entry for entry in outcomes
+                if passed[retried_test(entry[0]).id()]
+            )
+            outcomes[:] = [
+                entry for entry in outcomes
+                if not passed[retried_test(entry[0]).id()]
+            ]
+        self.stream.writeln("After retrying: %s" % self._results_breakdown())
+
+    def _write_failed_testcase(self, test, testcase):
+        "Write a failure's JUnit element, or hold it until it is retried."
+        if self.retries:
+            self._held_testcases.append((test, testcase))
+        else:
+            self._write_testcase(testcase)
+
+    def _write_held_testcases(self):
+        """
+        Write the failures held back for retrying, marking those that were
+        flaky as passed with a flakyFailure or flakyError, as Maven's
+        Surefire does.
+        """
+        flaky = set(id(test) for test, _ in self.flaky)
+        for test, testcase in self._held_testcases:
+            if id(test) in flaky:
+                for tag in ('error', 'failure'):
+                    for element in testcase.findall(tag):
+                        element.tag = 'flaky' + tag.capitalize()
+            self._write_testcase(testcase)
+        self._held_testcases = []
+
+    def _junit_counts(self):
+        return {
+            'errors': len(self.errors),
+            'failures': len(self.failures),
+            'skips': len(self.skipped),
+            'tests': self.junit_testcases,
+            'time': time.time() - self.start_time,
+        }
+
+    def _write_testcase(self, testcase):
+        self.junit_testcases += 1
+        self.junit.write_testcase(testcase, **self._junit_counts())
+
     def _make_testcase_element(self, test):
-        time_taken = time.time() - self.start_time
-        classname = ('%s.%s' % (test.__module__,
-                                test.__class__.__name__)).split('.')
-        testcase = self.ETree.SubElement(self.tree, 'testcase')
+        # a subtest is reported under its test's class, with its
+        # parameters after the name of the test method
+        case = retried_test(test)
+        classname = ('%s.%s' % (case.__module__,
+                                case.__class__.__name__)).split('.')
+        if hasattr(case, '_testMethodName'):
+            time_taken = time.time() - self.test_start_time
+            name = case._testMethodName
+            if case is not test:
+                name = '%s %s' % (name, test._subDescription())
+        else:
+            # errors in setUpClass and the like are reported against an
+            # _ErrorHolder, which has no test method and wasn't timed
+            time_taken = 0
+            name = str(test)
+        testcase = self.ETree.Element('testcase')
         testcase.set('time', "%.6f" % time_taken)
         testcase.set('classname', '.'.join(classname))
-        testcase.set('name', test._testMethodName)
+        testcase.set('name', name)
+
+        properties = []
+        # the setup of its class, if this is the class's first test
+        if self.setup_timer is not None:
+            properties.extend(
+                (phase, '%.6f' % elapsed)
+                for phase, elapsed in self.setup_timer.take(
+                    '.'.join(classname))
+            )
+        # the test has finished but its queries are still being counted
+        if self.query_recorder is not None and \
+                self.query_recorder.stack is not None:
+            properties.extend([
+                ('queries', '%i' % self.query_recorder.count),
+                ('db_time', '%.6f' % self.query_recorder.time),
+            ])
+        if self.baseline is not None:
+            regression = self.baseline.regression(test.id(), time_taken)
+            if regression is not None:
+                properties.extend([
+                    ('baseline', '%.6f' % regression.baseline),
+                    ('slowdown', '%.2f' % regression.ratio),
+                ])
+        if properties:
+            element = self.ETree.SubElement(testcase, 'properties')
+            for name, value in properties:
+                self.ETree.SubElement(
+                    element, 'property', name=name, value=value)
 
         return testcase
 
@@ -445,7 +1132,18 @@ class TextTestRunner(unittest.TextTestRunner):
             buffer=False,
             resultclass=None,
             total_tests=None,
-            slow_test_count=0
+            slow_test_count=0,
+            history=None,
+            partitions=None,
+            dependency_tracer=None,
+            cached_count=0,
+            query_recorder=None,
+            memory_profiler=None,
+            slow_test_profiler=None,
+            retries=0,
+            baseline=None,
+            setup_timer=None,
+            fail_on_regression=False
     ):
         self.stream = _WritelnDecorator(stream)
         self.descriptions = descriptions
@@ -456,19 +1154,50 @@ class TextTestRunner(unittest.TextTestRunner):
             self.resultclass = resultclass
         self.total_tests = total_tests
         self.slow_test_count = slow_test_count
-
-    def _makeResult(self):
+        self.history = history
+        self.partitions = partitions
+        self.dependency_tracer = dependency_tracer
+        self.cached_count = cached_count
+        self.query_recorder = query_recorder
+        self.memory_profiler = memory_profiler
+        self.slow_test_profiler = slow_test_profiler
+        self.retries = retries
+        self.baseline = baseline
+        self.setup_timer = setup_timer
+        self.fail_on_regression = fail_on_regression
+
+    def _makeResult(self, expected_durations=None):
         return self.resultclass(
             self.stream,
             self.descriptions,
             self.verbosity,
             total_tests=self.total_tests,
-            slow_test_count=self.slow_test_count
+            slow_test_count=self.slow_test_count,
+            expected_durations=expected_durations,
+            partitions=self.partitions,
+            dependency_tracer=self.dependency_tracer,
+            cached_count=self.cached_count,
+            query_recorder=self.query_recorder,
+            memory_profiler=self.memory_profiler,
+            slow_test_profiler=self.slow_test_profiler,
+            retries=self.retries,
+            baseline=self.baseline,
+            setup_timer=self.setup_timer
+        )
+
+    def _expected_durations(self, test):
+        "Look up the recorded duration of every test in the suite."
+        if self.history is None:
+            return None
+        recorded = self.history.durations()
+        return dict(
+            (t.id(), recorded[t.id()])
+            for t in iter_tests(test) if t.id() in recorded
         )
 
     def run(self, test):
         "Run the given test case or test suite."
-        result = self._makeResult()
+        result = self._makeResult(self._expected_durations(test))
         result.failfast = self.failfast
         result.buffer = self.buffer
         registerResult(result)
@@ -509,7 +1238,10 @@ class TextTestRunner(unittest.TextTestRunner):
         except AttributeError:
             pass
         infos = []
-        if not result.wasSuccessful():
+        # with fail_on_regression, the tests that got slower fail the run
+        # as far as the exit status goes, so they fail it here too
+        regressed = self.fail_on_regression and result.regressions
+        if not result.wasSuccessful() or regressed:
             self.stream.write(SET_FAIL_OUTPUT + " FAILED " + RESET_OUTPUT)
             failed, errored = list(map(len, (result.failures, result.errors)))
             if failed:
@@ -520,6 +1252,10 @@ class TextTestRunner(unittest.TextTestRunner):
                 infos.append("%serrors=%d%s" % (SET_ERROR_TEXT,
                                                 errored,
                                                 RESET_OUTPUT))
+            if regressed:
+                infos.append("%sregressions=%d%s" % (SET_FAILURE_TEXT,
+                                                     len(result.regressions),
+                                                     RESET_OUTPUT))
         else:
             self.stream.write(SET_OK_OUTPUT + " OK " + RESET_OUTPUT)
         if skipped:
@@ -528,18 +1264,121 @@ class TextTestRunner(unittest.TextTestRunner):
             infos.append("expected failures=%d" % expectedFails)
         if unexpectedSuccesses:
             infos.append("unexpected successes=%d" % unexpectedSuccesses)
+        if result.flaky:
+            infos.append("flaky=%d" % result.flaky_count)
+        if result.regressions and not regressed:
+            infos.append("slower=%d" % len(result.regressions))
+        if result.cached_count:
+            infos.append("cached=%d" % result.cached_count)
         if infos:
             self.stream.writeln(" (%s)" % (", ".join(infos),))
         else:
             self.stream.write("\n")
 
-        if result.slow_tests:
-            self.stream.writeln("Slow tests: ")
-        for test in result.slow_tests:
-            self.stream.writeln(
-                "{0} : {1}".format(test['name'],
-                                   result.format_time(test['elapsed']))
-            )
+        for title, slow_tests, format_time in (
+            ("Slow tests: ", result.slow_tests, result.format_time),
+            ("Slow test classes: ", result.slow_classes, result.format_time),
+            ("Slow test modules: ", result.slow_modules, result.format_time),
+            ("Slow class setup and teardown: ", result.slow_class_setup,
+             result.format_precise_time),
+            ("Slow fixtures: ", result.slow_fixtures,
+             result.format_precise_time),
+        ):
+            self.printSlowTests(result, title, slow_tests, format_time)
+
+        self.printRegressions(result)
+        self.writeProfiles(result)
+        self.printQueryCounts(result)
+        self.printMemory(result)
+        self.printPartitions(result)
 
         result.closeLogFiles()
         return result
+
+    def printPartitions(self, result):
+        if result.partitions:
+            self.stream.writeln("Parallel workers: ")
+        for partition in result.partitions:
+            self.stream.writeln(
+                "Worker {0} : {1} tests, predicted {2}, actual {3}".format(
+                    partition.index + 1,
+                    len(partition.tests),
+                    "--:--:--" if partition.predicted is None
+                    else result.format_time(partition.predicted),
+                    "--:--:--" if partition.actual is None
+                    else result.format_time(partition.actual),
+                )
+            )
+
+    def printRegressions(self, result):
+        if result.regressions:
+            self.stream.writeln("Slower than their baseline: ")
+        for regression in sorted(result.regressions,
+                                 key=lambda regression: regression.ratio,
+                                 reverse=True):
+            self.stream.writeln(
+                "{0} : {1:.3f}s, median {2:.3f}s ({3:.1f}x)".format(
+                    regression.name, regression.elapsed,
+                    regression.baseline, regression.ratio)
+            )
+
+    def writeProfiles(self, result):
+        if result.slow_test_profiler is None:
+            return
+        paths = result.slow_test_profiler.write(result.slow_tests)
+        if paths:
+            self.stream.writeln(
+                "Profiles of the slow tests written to %s" %
+                result.slow_test_profiler.directory)
+
+    def printQueryCounts(self, result):
+        if result.most_queries:
+            self.stream.writeln("Most queries: ")
+        for stats in result.most_queries:
+            self.stream.writeln(
+                "{0:6d} {1:9.3f}s  {2}".format(
+                    stats.count, stats.time, stats.name)
+            )
+            for statement, count in stats.repeated:
+                self.stream.writeln(
+                    "{0:>6} x {1}".format(count, statement[:200]))
+
+    def printMemory(self, result):
+        if result.memory_profiler is None:
+            return
+        for title, tests in (
+            ("Most memory retained: ", result.most_retained),
+            ("Most RSS growth: ", result.most_rss_growth),
+        ):
+            if tests:
+                self.stream.writeln(title)
+            for stats in tests:
+                self.stream.writeln(
+                    "{0} : {1} retained, {2} peak, RSS {3}".format(
+                        stats.name,
+                        format_size(stats.retained),
+                        "?" if stats.peak is None
+                        else format_size(stats.peak),
+                        "?" if stats.rss_growth is None
+                        else "%+d KiB" % (stats.rss_growth // 1024),
+                    )
+                )
+        if result.modules_retained:
+            self.stream.writeln("Memory retained by module: ")
+        for module, retained in result.modules_retained:
+            self.stream.writeln(
+                "{0} : {1}".format(module, format_size(retained)))
+        if result.memory_profiler.top_allocations:
+            self.stream.writeln("Top allocations still held: ")
+        for stat in result.memory_profiler.top_allocations:
+            self.stream.writeln(str(stat))
+
+    def printSlowTests(self, result, title, slow_tests, format_time):
+        if slow_tests:
+            self.stream.writeln(title)
+        for slow_test in slow_tests:
+            self.stream.writeln(
+                "{0} : {1}{2}".format(slow_test.name,
+                                      format_time(slow_test.elapsed),
+                                      result.describe_queries(slow_test.name))
+            )
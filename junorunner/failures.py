@@ -0,0 +1,71 @@
+"""
+Group errors and failures by where they were raised.
+
+When something many tests share breaks, thousands of them can fail with
+the same traceback. A failure's signature is its exception type, its
+message and the innermost few frames of its traceback outside unittest,
+so the failures of one storm share a signature while those of unrelated
+assertions, or of one shared assertion with different messages, don't.
+Only the first failure with each signature needs its traceback formatted,
+shown and logged; the rest can point back to it.
+"""
+from __future__ import unicode_literals
+
+import re
+import traceback
+
+# memory addresses, as in the default repr of an object, which differ
+# between otherwise identical messages
+ADDRESS = re.compile(r'0x[0-9a-fA-F]+')
+
+# long messages are told apart by how they start
+MESSAGE_LENGTH = 500
+
+
+class FailureGroup(object):
+    """The first test to fail with a signature, and how many have since."""
+    __slots__ = ('first', 'count')
+
+    def __init__(self, first):
+        self.first = first
+        self.count = 1
+
+
+def in_unittest(frame):
+    # unittest marks its modules with __unittest, which tracebacks
+    # rebuilt from a parallel worker don't keep, unlike __name__
+    frame_globals = frame.f_globals
+    return ('__unittest' in frame_globals or
+            frame_globals.get('__name__', '').startswith('unittest.'))
+
+
+def normalised_message(exc_value):
+    "Return an exception's message, with any memory addresses masked."
+    try:
+        message = '%s' % (exc_value,)
+    except Exception:
+        return ''
+    return ADDRESS.sub('0x?', message)[:MESSAGE_LENGTH]
+
+
+def exception_line(err):
+    "Return the last line of an error's traceback: its exception and message."
+    lines = traceback.format_exception_only(err[0], err[1])
+    return lines[-1].strip() if lines else ''
+
+
+def failure_signature(err, depth):
+    """
+    Return the signature of an error: its exception type, its normalised
+    message and the file, line and function of the innermost depth frames
+    outside unittest.
+    """
+    exc_class, exc_value, tb = err
+    frames = []
+    while tb is not None:
+        if not in_unittest(tb.tb_frame):
+            code = tb.tb_frame.f_code
+            frames.append((code.co_filename, tb.tb_lineno, code.co_name))
+        tb = tb.tb_next
+    return (exc_class.__module__, exc_class.__name__,
+            normalised_message(exc_value)) + tuple(frames[-depth:])
@@ -0,0 +1,124 @@
+"""
+Parse each fixture file once per run, however many classes load it.
+
+Django's TestCase loads its fixtures afresh for every class that lists
+them, reading and parsing the same JSON or YAML each time. While the
+cache is installed, the parsed contents of each fixture file are kept,
+keyed by its path and modification time, and handed to Django's Python
+deserializer on later loads, which still builds and saves fresh model
+instances every time. Entries are evicted least recently used first once
+the fixture files they came from add up to more than the cache's limit.
+The limit is on the size of the files on disk, which is cheap to know,
+not on the memory their parsed contents take, which is usually several
+times as much.
+"""
+from __future__ import unicode_literals
+
+import json
+import os
+import timeit
+from collections import OrderedDict
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+def parse_json(stream):
+    data = stream.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def parse_yaml(stream):
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader',
+                                            yaml.SafeLoader))
+
+
+PARSERS = {'json': parse_json}
+if yaml is not None:
+    PARSERS['yaml'] = parse_yaml
+
+
+class CachedFixture(object):
+    """
+    The parsed contents of a fixture file, the size of the file, and how
+    long parsing took.
+    """
+    __slots__ = ('objects', 'file_bytes', 'parse_time')
+
+    def __init__(self, objects, file_bytes, parse_time):
+        self.objects = objects
+        self.file_bytes = file_bytes
+        self.parse_time = parse_time
+
+
+class FixtureCache(object):
+
+    def __init__(self, file_bytes):
+        # the most bytes of fixture files to keep the contents of
+        self.file_bytes = file_bytes
+        self.entries = OrderedDict()
+        self.file_bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.time_saved = 0.0
+        self.deserialize = None
+
+    def install(self):
+        "Serve the fixtures loaddata deserializes from the cache."
+        from django.core import serializers
+        self.deserialize = serializers.deserialize
+        serializers.deserialize = self.cached_deserialize
+
+    def uninstall(self):
+        if self.deserialize is not None:
+            from django.core import serializers
+            serializers.deserialize = self.deserialize
+            self.deserialize = None
+
+    def cached_deserialize(self, format, stream_or_string, **options):
+        from django.core.serializers.python import (
+            Deserializer as PythonDeserializer,
+        )
+
+        # only files loaddata opened by name can be cached, not strings or
+        # file objects opened from a descriptor, which they're named by
+        path = getattr(stream_or_string, 'name', None)
+        if format not in PARSERS or path is None or isinstance(path, int) \
+                or not os.path.isfile(path):
+            return self.deserialize(format, stream_or_string, **options)
+
+        key = (os.path.abspath(path), os.path.getmtime(path), format)
+        entry = self.entries.get(key)
+        if entry is not None:
+            # most recently used last
+            self.entries[key] = self.entries.pop(key)
+            self.hits += 1
+            self.time_saved += entry.parse_time
+            return PythonDeserializer(entry.objects, **options)
+
+        start = timeit.default_timer()
+        try:
+            objects = PARSERS[format](stream_or_string)
+        except Exception:
+            # let Django parse it again, and report the error its own way
+            stream_or_string.seek(0)
+            return self.deserialize(format, stream_or_string, **options)
+        self.misses += 1
+        self.add(key, CachedFixture(objects, os.path.getsize(path),
+                                    timeit.default_timer() - start))
+        return PythonDeserializer(objects, **options)
+
+    def add(self, key, entry):
+        if entry.file_bytes > self.file_bytes:
+            return
+        self.entries[key] = entry
+        self.file_bytes_used += entry.file_bytes
+        while self.file_bytes_used > self.file_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.file_bytes_used -= evicted.file_bytes
+            self.evictions += 1
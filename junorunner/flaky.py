@@ -0,0 +1,106 @@
+"""
+Tell flaky tests from broken ones by running the failures again.
+
+Once the run is over, each test that failed or errored is run again on
+its own, in the same process and against the same test database, up to a
+given number of times. A test that passes on any of those attempts is
+flaky; one that fails every time is consistently failing. How often each
+test has turned out flaky is kept with the duration history, so that the
+chronic offenders stand out from the one-off.
+"""
+from __future__ import unicode_literals
+
+import sqlite3
+import time
+import unittest
+
+
+def retried_test(test):
+    "Return the test that is run again for a failure: a subTest's parent."
+    return getattr(test, 'test_case', test)
+
+
+def isolated_copy(test):
+    """
+    Return a fresh instance of a failed test to run again, or None if it
+    can't be run on its own.
+    """
+    test = retried_test(test)
+    # errors in setUpClass and the like are reported against an
+    # _ErrorHolder, which has no test method
+    method = getattr(test, '_testMethodName', None)
+    if method is None:
+        return None
+    return type(test)(method)
+
+
+def passes_on_retry(test, retries):
+    """
+    Run a failed test again up to retries times, stopping at the first
+    pass. Return the number of the attempt that passed, or None if it
+    failed every time or can't be run again.
+    """
+    for attempt in range(1, retries + 1):
+        copy = isolated_copy(test)
+        if copy is None:
+            return None
+        result = unittest.TestResult()
+        # run as a suite, so the class fixtures are set up around it
+        unittest.TestSuite([copy])(result)
+        if result.testsRun and result.wasSuccessful():
+            return attempt
+    return None
+
+
+class FlakeHistory(object):
+    """
+    For each test id, how many runs retrying failures it has been in, and
+    in how many of those it was flaky or consistently failing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS flakes ("
+                "test_id TEXT PRIMARY KEY, "
+                "runs INTEGER NOT NULL, "
+                "flaky INTEGER NOT NULL, "
+                "failing INTEGER NOT NULL, "
+                "last_flaky REAL)"
+            )
+
+    def record(self, outcomes):
+        "Count a run, given the dict of test id -> outcome of its tests."
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO flakes (test_id, runs, flaky, failing) "
+                "VALUES (?, 0, 0, 0)",
+                ((test_id,) for test_id in outcomes)
+            )
+            self.connection.executemany(
+                "UPDATE flakes SET runs = runs + 1, flaky = flaky + ?, "
+                "failing = failing + ?, "
+                "last_flaky = CASE WHEN ? THEN ? ELSE last_flaky END "
+                "WHERE test_id = ?",
+                ((outcome == 'flaky', outcome in ('error', 'failure'),
+                  outcome == 'flaky', now, test_id)
+                 for test_id, outcome in outcomes.items())
+            )
+
+    def flakiest(self, count):
+        """
+        Return (test id, runs, flaky runs) for the tests that have most
+        often been flaky, by the proportion of their runs.
+        """
+        return self.connection.execute(
+            "SELECT test_id, runs, flaky FROM flakes WHERE flaky > 0 "
+            "ORDER BY CAST(flaky AS REAL) / runs DESC, flaky DESC "
+            "LIMIT ?",
+            (count,)
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,153 @@
+"""
+A small SQLite store of how long each test took on previous runs, so that
+the runner can make informed guesses about the run that is in progress.
+
+Alongside the last duration of each test, the last few are kept, whose
+median makes a baseline steady enough to tell a test that has got slower
+from one that was unlucky once.
+"""
+from __future__ import unicode_literals
+
+import sqlite3
+import time
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class Regression(object):
+    """A test that ran slower than its baseline."""
+    __slots__ = ('name', 'elapsed', 'baseline')
+
+    def __init__(self, name, elapsed, baseline):
+        self.name = name
+        self.elapsed = elapsed
+        self.baseline = baseline
+
+    @property
+    def ratio(self):
+        return self.elapsed / self.baseline if self.baseline else float('inf')
+
+
+class Baseline(object):
+    """
+    The median recorded durations of the tests, and how much slower than
+    that a test has to run to count as a regression: by the given ratio,
+    and by at least threshold seconds, so that quick tests aren't flagged
+    for the odd millisecond.
+    """
+
+    def __init__(self, medians, ratio, threshold):
+        self.medians = medians
+        self.ratio = ratio
+        self.threshold = threshold
+
+    def regression(self, test_id, elapsed):
+        "Return a Regression if the test ran too slowly, else None."
+        baseline = self.medians.get(test_id)
+        if baseline is None:
+            return None
+        if elapsed > baseline * self.ratio and \
+                elapsed - baseline > self.threshold:
+            return Regression(test_id, elapsed, baseline)
+        return None
+
+
+class DurationHistory(object):
+    """
+    Per-test durations, keyed by test id, persisted across runs, keeping
+    the last sample_count of them for each test.
+    """
+
+    def __init__(self, path, sample_count=5):
+        self.path = path
+        self.sample_count = sample_count
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS durations ("
+                "test_id TEXT PRIMARY KEY, "
+                "duration REAL NOT NULL, "
+                "recorded REAL NOT NULL)"
+            )
+            # the samples are space-separated, oldest first
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS duration_samples ("
+                "test_id TEXT PRIMARY KEY, "
+                "samples TEXT NOT NULL, "
+                "recorded REAL NOT NULL)"
+            )
+
+    def durations(self):
+        "Return a dict of test id -> last recorded duration in seconds."
+        return dict(
+            self.connection.execute("SELECT test_id, duration FROM durations")
+        )
+
+    def samples(self):
+        "Return a dict of test id -> its recent durations, oldest first."
+        return dict(
+            (test_id, [float(sample) for sample in samples.split()])
+            for test_id, samples in self.connection.execute(
+                "SELECT test_id, samples FROM duration_samples")
+        )
+
+    def baselines(self, minimum):
+        """
+        Return a dict of test id -> the median of its recorded durations,
+        for the tests with at least minimum of them.
+        """
+        return dict(
+            (test_id, median(samples))
+            for test_id, samples in self.samples().items()
+            if len(samples) >= minimum
+        )
+
+    def record(self, durations):
+        "Store the given dict of test id -> duration in seconds."
+        now = time.time()
+        samples = self.samples()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO durations "
+                "(test_id, duration, recorded) VALUES (?, ?, ?)",
+                ((test_id, duration, now)
+                 for test_id, duration in durations.items())
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO duration_samples "
+                "(test_id, samples, recorded) VALUES (?, ?, ?)",
+                ((test_id,
+                  ' '.join('%.6f' % sample for sample in (
+                      samples.get(test_id, []) + [duration]
+                  )[-self.sample_count:]),
+                  now)
+                 for test_id, duration in durations.items())
+            )
+
+    def merge(self, other):
+        """
+        Take the durations from another DurationHistory, where they were
+        recorded more recently than ours.
+        """
+        for table, value in (('durations', 'duration'),
+                             ('duration_samples', 'samples')):
+            recorded = dict(self.connection.execute(
+                "SELECT test_id, recorded FROM %s" % table))
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO %s (test_id, %s, recorded) "
+                    "VALUES (?, ?, ?)" % (table, value),
+                    (row for row in other.connection.execute(
+                        "SELECT test_id, %s, recorded FROM %s" % (
+                            value, table))
+                     if row[2] > recorded.get(row[0], 0))
+                )
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,124 @@
+"""
+Time the imports made while setting up and finding the tests.
+
+A finder placed at the front of sys.meta_path hands every import on to
+the usual finders, and wraps the exec_module of the loader they find, so
+that running each module's body is timed, until the profiler is stopped
+and the loaders get their own exec_module back. Imports a module makes while
+its body runs are timed inside it, which gives each module a cumulative
+time and, less what its own imports took, a self time, as with
+``python -X importtime``. Each import is also put down to the outermost
+module being imported at the time: for imports made while finding the
+tests, the test module that pulled it in.
+"""
+from __future__ import unicode_literals
+
+import sys
+import timeit
+from collections import defaultdict
+
+
+class ImportTime(object):
+    """How long importing one module took, and what pulled it in."""
+    __slots__ = ('name', 'cumulative', 'self_time', 'root')
+
+    def __init__(self, name, cumulative, self_time, root):
+        self.name = name
+        self.cumulative = cumulative
+        self.self_time = self_time
+        self.root = root
+
+
+class ImportProfiler(object):
+
+    def __init__(self):
+        self.imports = []
+        # [name, start, time spent in its own imports] for each module
+        # whose body is running
+        self.stack = []
+        self.running = False
+        # the loaders given a timed exec_module, by id, with the one each
+        # had of its own before, if any
+        self.wrapped = {}
+
+    @staticmethod
+    def available():
+        # loaders with exec_module
+        return sys.version_info >= (3, 4)
+
+    def start(self):
+        self.running = True
+        sys.meta_path.insert(0, self)
+
+    def stop(self):
+        self.running = False
+        sys.meta_path.remove(self)
+        for loader, own in self.wrapped.values():
+            if own is None:
+                del loader.exec_module
+            else:
+                loader.exec_module = own
+        self.wrapped = {}
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                # builtin and frozen modules are loaded by the importer
+                # class itself, which we leave alone, and a loader can
+                # load more than one module
+                loader = spec.loader
+                if (loader is not None and not isinstance(loader, type) and
+                        hasattr(loader, 'exec_module') and
+                        hasattr(loader, '__dict__') and
+                        id(loader) not in self.wrapped):
+                    self.wrapped[id(loader)] = (
+                        loader, loader.__dict__.get('exec_module'))
+                    loader.exec_module = self.timed(loader.exec_module)
+                return spec
+        return None
+
+    def timed(self, exec_module):
+        def timed_exec_module(module):
+            if not self.running:
+                return exec_module(module)
+            self.stack.append([module.__name__, timeit.default_timer(), 0.0])
+            try:
+                return exec_module(module)
+            finally:
+                self.record(*self.stack.pop())
+        return timed_exec_module
+
+    def record(self, name, start, children):
+        elapsed = timeit.default_timer() - start
+        if self.stack:
+            self.stack[-1][2] += elapsed
+            root = self.stack[0][0]
+        else:
+            root = name
+        self.imports.append(ImportTime(name, elapsed, elapsed - children,
+                                       root))
+
+    @property
+    def total(self):
+        "The time taken by all the imports, not counting any twice."
+        return sum(entry.self_time for entry in self.imports)
+
+    def slowest(self, count):
+        "The imports that took longest, counting their own imports."
+        return sorted(self.imports, key=lambda entry: entry.cumulative,
+                      reverse=True)[:count]
+
+    def slowest_roots(self, count):
+        """
+        The (module, time) pairs for the modules imported directly, by the
+        runner or Django rather than by another module, that took longest
+        along with everything they pulled in.
+        """
+        totals = defaultdict(float)
+        for entry in self.imports:
+            totals[entry.root] += entry.self_time
+        return sorted(totals.items(), key=lambda item: item[1],
+                      reverse=True)[:count]
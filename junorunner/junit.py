@@ -0,0 +1,92 @@
+"""
+Write JUnit compatible XML one test at a time.
+
+Each <testcase> is appended to the file once the test has finished, about
+once a second, or straight away for errors and failures, and the closing
+</testsuite> tag and the counts on the opening one are rewritten in place
+each time, so the file is a complete document at any point during the run,
+even one killed half way through, and memory use doesn't grow with the
+number of tests.
+"""
+from __future__ import unicode_literals
+
+import os
+import time
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>\n'
+CLOSING_TAG = b'</testsuite>\n'
+
+# room left for the attributes of the opening tag, so the counts can be
+# rewritten without moving anything that follows them
+HEADER_WIDTH = 256
+
+# seeking back over the closing tag to rewrite the header flushes the
+# file, which takes longer than a fast test does, so it's done at most
+# this often, in seconds, except for the elements with these tags
+WRITE_INTERVAL = 1.0
+URGENT_TAGS = ('error', 'failure')
+
+
+class JUnitWriter(object):
+
+    def __init__(self, path, name, interval=WRITE_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self.pending = []
+        self.last_write = time.time()
+        self.file = open(path, 'wb')
+        self.file.write(DECLARATION)
+        self.header_offset = self.file.tell()
+        self.write_header(errors=0, failures=0, skips=0, tests=0, time=0)
+        self.file.write(CLOSING_TAG)
+        self.file.flush()
+
+    def write_header(self, errors, failures, skips, tests, time):
+        attributes = (
+            ('name', self.name),
+            ('errors', '%i' % errors),
+            ('failures', '%i' % failures),
+            ('skips', '%i' % skips),
+            ('tests', '%i' % tests),
+            ('time', '%.3f' % time),
+        )
+        header = '<testsuite %s' % ' '.join(
+            '%s=%s' % (key, quoteattr(value)) for key, value in attributes
+        )
+        header = header.ljust(HEADER_WIDTH - 2) + '>\n'
+        if len(header) > HEADER_WIDTH:
+            raise ValueError("JUnit testsuite attributes are too long")
+
+        self.file.seek(self.header_offset)
+        self.file.write(header.encode('utf-8'))
+
+    def write_testcase(self, testcase, **counts):
+        """
+        Append a <testcase> element, and update the counts to match, once
+        the interval has passed since the last write or if it failed.
+        """
+        # us-ascii writes anything else as character references, so the
+        # element is the same bytes whatever the encoding of the file
+        self.pending.append(
+            ElementTree.tostring(testcase, encoding='us-ascii'))
+        urgent = any(
+            testcase.find(tag) is not None for tag in URGENT_TAGS)
+        if urgent or time.time() - self.last_write >= self.interval:
+            self.write_pending(**counts)
+
+    def write_pending(self, **counts):
+        "Write the elements held back, and the counts including them."
+        self.file.seek(-len(CLOSING_TAG), os.SEEK_END)
+        for testcase in self.pending:
+            self.file.write(testcase + b'\n')
+        self.file.write(CLOSING_TAG)
+        self.write_header(**counts)
+        self.file.flush()
+        self.pending = []
+        self.last_write = time.time()
+
+    def close(self, **counts):
+        self.write_pending(**counts)
+        self.file.close()
@@ -0,0 +1,108 @@
+"""
+Merge the reports of a run split across machines with --shard.
+
+Each directory given holds the files one shard left behind, under the
+names they have in the settings. They are merged into those same files
+here, as if the whole suite had been run in one go: the JUnit XML, the
+rerun log, the failure list and the duration history.
+"""
+from __future__ import unicode_literals
+
+import os
+from xml.etree import ElementTree
+
+from django.core.management.base import BaseCommand, CommandError
+
+from junorunner.extended_runner import TextTestResult
+from junorunner.history import DurationHistory
+from junorunner.junit import JUnitWriter
+from junorunner.runner import JunoDiscoverRunner
+
+JUNIT_COUNTS = ('errors', 'failures', 'skips', 'tests')
+
+
+class Command(BaseCommand):
+    help = ("Merge the JUnit XML, rerun logs, failure lists and duration "
+            "history left by each --shard into one report.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directories',
+                            nargs='+',
+                            metavar='DIRECTORY',
+                            help="A directory holding one shard's files")
+
+    def handle(self, *args, **options):
+        directories = options['directories']
+        for directory in directories:
+            if not os.path.isdir(directory):
+                raise CommandError("%s is not a directory" % directory)
+
+        self.merge_lines(directories, TextTestResult.RERUN_LOG_FILE_NAME)
+        self.merge_lines(directories, TextTestResult.FAILURE_LIST_FILENAME)
+        if TextTestResult.JUNIT_FILE is not None:
+            self.merge_junit(directories, TextTestResult.JUNIT_FILE)
+        if JunoDiscoverRunner.HISTORY_FILE_NAME is not None:
+            self.merge_history(directories,
+                               JunoDiscoverRunner.HISTORY_FILE_NAME)
+
+    def shard_files(self, directories, path):
+        "Return the copies of a file the shards left, warning of any missing."
+        paths = []
+        for directory in directories:
+            shard_path = os.path.join(directory, os.path.basename(path))
+            if os.path.exists(shard_path):
+                paths.append(shard_path)
+            else:
+                self.stderr.write("No %s in %s" % (
+                    os.path.basename(path), directory))
+        return paths
+
+    def merge_lines(self, directories, path):
+        contents = []
+        for shard_path in self.shard_files(directories, path):
+            with open(shard_path) as shard_file:
+                contents.append(shard_file.read())
+        with open(path, 'w') as merged:
+            merged.write(''.join(contents))
+        self.stdout.write("Merged %i shards into %s" % (len(contents), path))
+
+    def merge_junit(self, directories, path):
+        # read everything before writing, in case a shard's file is the
+        # one being written
+        suites = [
+            ElementTree.parse(shard_path).getroot()
+            for shard_path in self.shard_files(directories, path)
+        ]
+        counts = dict.fromkeys(JUNIT_COUNTS, 0)
+        counts['time'] = 0.0
+        writer = JUnitWriter(path, 'Django Project Tests')
+        for suite in suites:
+            for testcase in suite.iter('testcase'):
+                counts['tests'] += 1
+                for tag, count in (('error', 'errors'),
+                                   ('failure', 'failures'),
+                                   ('skipped', 'skips')):
+                    if testcase.find(tag) is not None:
+                        counts[count] += 1
+                counts['time'] += float(testcase.get('time', 0))
+                writer.write_testcase(testcase, **counts)
+        writer.close(**counts)
+        self.stdout.write(
+            "Merged %i shards into %s: %i tests, %i errors, %i failures" % (
+                len(suites), path, counts['tests'], counts['errors'],
+                counts['failures']))
+
+    def merge_history(self, directories, path):
+        history = DurationHistory(path)
+        shard_paths = [
+            shard_path
+            for shard_path in self.shard_files(directories, path)
+            if os.path.abspath(shard_path) != os.path.abspath(path)
+        ]
+        for shard_path in shard_paths:
+            shard_history = DurationHistory(shard_path)
+            history.merge(shard_history)
+            shard_history.close()
+        history.close()
+        self.stdout.write(
+            "Merged %i shards into %s" % (len(shard_paths), path))
@@ -0,0 +1,113 @@
+"""
+Track the memory each test allocates and keeps hold of.
+
+tracemalloc (Python 3.4+) gives the peak traced memory during each test
+(on Python 3.9+, where the peak can be reset) and the memory still
+allocated once it has stopped, compared to when it started. Memory a test
+leaves behind, in class-level caches or module globals, shows up as
+retained. Process RSS is sampled as well, as the figure an OOM killer
+goes by.
+"""
+from __future__ import unicode_literals
+
+import os
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# how many frames of each allocation to keep, and how many of the top
+# allocators to report
+TRACEBACK_FRAMES = 1
+TOP_ALLOCATIONS = 10
+
+
+def current_rss():
+    "Return the resident set size of this process in bytes, if known."
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    # the best we can do elsewhere is the peak, which still shows growth
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024.0
+    return "%.1f GiB" % size
+
+
+class MemoryStats(object):
+    """The memory one test used."""
+    __slots__ = ('name', 'peak', 'retained', 'rss_growth')
+
+    def __init__(self, name, peak, retained, rss_growth):
+        self.name = name
+        self.peak = peak
+        self.retained = retained
+        self.rss_growth = rss_growth
+
+
+class MemoryProfiler(object):
+
+    def __init__(self):
+        self.run_snapshot = None
+        self.top_allocations = []
+
+    @staticmethod
+    def available():
+        return tracemalloc is not None
+
+    def start_run(self):
+        tracemalloc.start(TRACEBACK_FRAMES)
+        self.run_snapshot = tracemalloc.take_snapshot()
+
+    def stop_run(self):
+        """
+        Stop tracing, keeping the source lines that allocated the most
+        memory still held since the start of the run.
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(
+                False, os.path.join(os.path.dirname(__file__), '*')),
+        ))
+        self.top_allocations = [
+            stat for stat in snapshot.compare_to(self.run_snapshot, 'lineno')
+            if stat.size_diff > 0
+        ][:TOP_ALLOCATIONS]
+        self.run_snapshot = None
+        tracemalloc.stop()
+
+    def start(self):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.before = tracemalloc.get_traced_memory()[0]
+        self.rss_before = current_rss()
+
+    def stop(self, name):
+        "Return the MemoryStats for the test that has just stopped."
+        current, peak = tracemalloc.get_traced_memory()
+        rss = current_rss()
+        return MemoryStats(
+            name,
+            peak - self.before if hasattr(tracemalloc, 'reset_peak') else None,
+            current - self.before,
+            None if rss is None else rss - self.rss_before
+        )
@@ -0,0 +1,263 @@
+"""
+A parallel test suite that hands out TestCase classes one at a time.
+
+Django's ParallelTestSuite (and the duration-balanced partitions built on
+top of it) decide up front which tests each worker runs, and report each
+sub-suite back only once it has finished. Here every worker is given the
+next class as soon as it is free, so a class that turns out slower than
+expected doesn't hold up the end of the run, and each test is reported
+back to the parent's result as soon as it has finished.
+
+A class never leaves the worker that started it, so setUpClass and
+setUpTestData behave as they do in a serial run.
+
+The workers are forked from the parent once the suite is built and the
+test databases (one clone per worker) are set up, so they start warm. The
+parent decides which worker runs what, and each worker reports over its
+own pipe, which nothing is lost from when the worker dies. So when a
+worker dies the parent knows which test was running: that test is
+reported as an error, the rest of its class is queued again, and a new
+worker is forked in its place, using the same database clone.
+"""
+from __future__ import unicode_literals
+
+import ctypes
+import multiprocessing
+import sys
+import time
+import unittest
+from collections import deque
+
+try:
+    from multiprocessing.connection import wait
+except ImportError:
+    # Python 2
+    wait = None
+
+from django.test.runner import ParallelTestSuite, RemoteTestResult
+
+
+class WorkerDied(Exception):
+    pass
+
+
+def fork_available():
+    """
+    The workers inherit the built suite, so they have to be forked, and
+    the parent waits on their pipes, which needs Python 3.3+.
+    """
+    if wait is None:
+        return False
+    return multiprocessing.get_start_method() == 'fork'
+
+
+class _EventStream(object):
+    """
+    Stands in for RemoteTestResult.events, sending the events for each
+    test to the parent once the test has stopped, along with how long it
+    took in the worker. Tests are identified by their position in the
+    whole class, rather than in the part of it the worker was given.
+    """
+
+    def __init__(self, connection, positions):
+        self.connection = connection
+        self.positions = positions
+        self.pending = []
+        self.test_start_time = None
+
+    def append(self, event):
+        self.pending.append(
+            (event[0], self.positions[event[1]]) + tuple(event[2:]))
+        if event[0] == 'startTest':
+            self.test_start_time = time.time()
+        elif event[0] == 'stopTest':
+            self.flush(time.time() - self.test_start_time)
+
+    def flush(self, elapsed=None, done=False):
+        self.connection.send((self.pending, elapsed, done))
+        self.pending = []
+
+
+def _run_classes(init_worker, worker_id, connection, subsuites, failfast,
+                 buffer):
+    """
+    Worker loop: run the (class, test positions) tasks the parent sends
+    until told to stop.
+
+    This helper lives at module-level because of the multiprocessing
+    module's requirements.
+    """
+    # Django numbers the workers, and so their databases, by counting
+    # them in; a replacement worker has to count in as the one it replaces
+    init_worker(multiprocessing.Value(ctypes.c_int, worker_id - 1))
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        index, positions = task
+        tests = list(subsuites[index])
+        result = RemoteTestResult()
+        result.events = _EventStream(connection, positions)
+        result.failfast = failfast
+        result.buffer = buffer
+        subsuites[index].__class__(
+            [tests[position] for position in positions])(result)
+        result.events.flush(done=True)
+
+
+class _Worker(object):
+    """A worker process, and the task it is running, as the parent sees it."""
+
+    def __init__(self, worker_id, process, connection):
+        self.worker_id = worker_id
+        self.process = process
+        self.connection = connection
+        self.task = None
+        # positions of the tests in the task that have been reported
+        self.reported = set()
+
+    def assign(self, task):
+        self.task = task
+        self.reported = set()
+        self.connection.send(task)
+
+
+class DynamicTestSuite(unittest.TestSuite):
+    """
+    Run TestCase classes in parallel, each worker being given the next
+    class when it is free.
+
+    ``subsuites`` should hold one sub-suite per class, in the order they
+    are to be handed out.
+    """
+    init_worker = ParallelTestSuite.init_worker
+
+    # each test is timed in the worker, so the durations the result sees
+    # are worth keeping
+    reports_durations = True
+
+    def __init__(self, subsuites, processes, failfast=False, buffer=False):
+        self.subsuites = subsuites
+        self.processes = processes
+        self.failfast = failfast
+        self.buffer = buffer
+        super(DynamicTestSuite, self).__init__()
+
+    def __iter__(self):
+        return iter(self.subsuites)
+
+    def start_worker(self, worker_id):
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_run_classes,
+            args=(self.init_worker.__func__, worker_id, worker_connection,
+                  self.subsuites, self.failfast, self.buffer)
+        )
+        process.start()
+        # so that the pipe reads as closed once the worker has gone, and
+        # workers forked later don't hold it open
+        worker_connection.close()
+        worker = _Worker(worker_id, process, connection)
+        self.workers[connection] = worker
+        return worker
+
+    def assign(self, worker):
+        "Give a free worker the next task, or tell it to stop."
+        if self.pending:
+            worker.assign(self.pending.popleft())
+        else:
+            worker.task = None
+            worker.connection.send(None)
+
+    def run(self, result):
+        self.pending = deque(
+            (index, list(range(len(list(subsuite)))))
+            for index, subsuite in enumerate(self.subsuites)
+        )
+        self.workers = {}
+
+        tests = [list(subsuite) for subsuite in self.subsuites]
+        remaining = len(self.subsuites)
+        for worker_id in range(1, self.processes + 1):
+            self.assign(self.start_worker(worker_id))
+
+        while remaining and self.workers and not result.shouldStop:
+            for connection in wait(list(self.workers)):
+                worker = self.workers[connection]
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    # the worker has exited
+                    message = None
+                if message is None:
+                    remaining -= self.recover(result, tests, worker)
+                    continue
+
+                test_events, elapsed, done = message
+                index = worker.task[0]
+                result.worker_id = worker.worker_id
+                for event in test_events:
+                    if event[0] == 'stopTest':
+                        worker.reported.add(event[1])
+                    handler = getattr(result, event[0], None)
+                    if handler is None:
+                        continue
+                    handler(tests[index][event[1]], *event[2:])
+                    if event[0] == 'startTest' and elapsed is not None:
+                        # the events arrive together once the test has
+                        # stopped, so time it as it ran in the worker
+                        result.test_start_time = time.time() - elapsed
+                if done:
+                    remaining -= 1
+                    self.assign(worker)
+
+        for worker in self.workers.values():
+            if result.shouldStop:
+                worker.process.terminate()
+            elif worker.task is not None:
+                worker.connection.send(None)
+            worker.process.join()
+
+        if remaining and not result.shouldStop:
+            raise RuntimeError(
+                "The parallel workers exited with %i TestCase classes "
+                "left to run" % remaining)
+        return result
+
+    def recover(self, result, tests, worker):
+        """
+        Deal with a worker that has exited. If it died part way through a
+        class, report the test that was running as an error, queue the rest
+        of the class again and, if there is anything left to run, start a
+        new worker in its place. Return how many classes that finished.
+        """
+        del self.workers[worker.connection]
+        worker.process.join()
+        if worker.task is None:
+            # told to stop, or died before it was given anything
+            return 0
+
+        index, positions = worker.task
+        unfinished = [position for position in positions
+                      if position not in worker.reported]
+        if unfinished:
+            self.report_crash(result, worker, tests[index][unfinished[0]])
+        finished = 1
+        if len(unfinished) > 1:
+            self.pending.appendleft((index, unfinished[1:]))
+            finished = 0
+        if self.pending:
+            self.assign(self.start_worker(worker.worker_id))
+        return finished
+
+    def report_crash(self, result, worker, test):
+        try:
+            raise WorkerDied(
+                "Parallel worker %i died (exit code %s) while running "
+                "this test" % (worker.worker_id, worker.process.exitcode))
+        except WorkerDied:
+            err = sys.exc_info()
+        result.worker_id = worker.worker_id
+        result.startTest(test)
+        result.addError(test, err)
+        result.stopTest(test)
@@ -0,0 +1,120 @@
+"""
+Split a suite into sub-suites of roughly equal duration for parallel runs.
+
+Django hands each TestCase class to whichever worker is free, in the order
+they were discovered, so a heavy class found late keeps one worker busy
+long after the others have finished. Instead we weigh each class by the
+recorded durations of its tests and pack the classes into one sub-suite
+per worker, longest first.
+
+The same split, made over the whole suite, divides it into shards for
+separate CI machines. It depends only on the tests and their recorded
+durations, so machines sharing both always agree on it.
+"""
+from __future__ import unicode_literals
+
+import argparse
+import heapq
+import unittest
+from collections import OrderedDict
+
+
+class Partition(object):
+    """The tests given to one worker, and how long we expect them to take."""
+    __slots__ = ('index', 'tests', 'predicted', 'actual')
+
+    def __init__(self, index):
+        self.index = index
+        self.tests = []
+        self.predicted = 0.0
+        self.actual = None
+
+    def __lt__(self, other):
+        return (self.predicted, self.index) < (other.predicted, other.index)
+
+
+def group_by_case(tests):
+    """
+    Group tests by TestCase class, keeping the order in which each class
+    was first seen.
+    """
+    groups = OrderedDict()
+    for test in tests:
+        groups.setdefault(type(test), []).append(test)
+    return list(groups.values())
+
+
+def case_weights(groups, durations):
+    """
+    Weigh each group of tests by the sum of their recorded durations.
+
+    Tests without a recorded duration are counted as the average recorded
+    test; without any history at all every test counts as 1, which turns
+    this into a split by test count.
+    """
+    known = [durations[test.id()]
+             for group in groups for test in group if test.id() in durations]
+    default = sum(known) / len(known) if known else 1.0
+    return [
+        sum(durations.get(test.id(), default) for test in group)
+        for group in groups
+    ]
+
+
+def partition_tests(tests, processes, durations):
+    """
+    Pack the tests into ``processes`` partitions using the
+    longest-processing-time-first heuristic: take the classes heaviest
+    first and give each to the partition with the least work so far.
+
+    Each partition keeps its classes in their original relative order, so
+    the TestCase/TransactionTestCase ordering chosen by the runner holds
+    within every worker.
+    """
+    groups = group_by_case(tests)
+    weights = case_weights(groups, durations)
+
+    partitions = [Partition(index) for index in range(processes)]
+    heap = list(partitions)
+    assigned = [[] for _ in partitions]
+    for position in sorted(range(len(groups)),
+                           key=lambda i: weights[i], reverse=True):
+        partition = heapq.heappop(heap)
+        partition.predicted += weights[position]
+        assigned[partition.index].append(position)
+        heapq.heappush(heap, partition)
+
+    for partition, positions in zip(partitions, assigned):
+        for position in sorted(positions):
+            partition.tests.extend(groups[position])
+    return [partition for partition in partitions if partition.tests]
+
+
+def as_subsuites(partitions):
+    "Turn partitions into the flat sub-suites a ParallelTestSuite expects."
+    return [unittest.TestSuite(partition.tests) for partition in partitions]
+
+
+def parse_shard(value):
+    "Parse an INDEX/COUNT shard argument, counting shards from 1."
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected INDEX/COUNT, e.g. 1/8, not %r" % value)
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard index must be between 1 and %i, not %i" % (count, index))
+    return index, count
+
+
+def shard_tests(tests, index, count, durations):
+    """
+    Return the tests of shard ``index`` (from 1) out of ``count``, with
+    the TestCase classes packed into shards as they would be into parallel
+    workers.
+    """
+    for partition in partition_tests(tests, count, durations):
+        if partition.index == index - 1:
+            return partition.tests
+    return []
@@ -0,0 +1,94 @@
+"""
+Profile every test, keeping the profiles of only the slowest.
+
+Each test runs under cProfile. The profile travels with the test's entry
+in the slow test heap, so it is dropped as soon as the test is pushed out
+of the top N, and only N profiles are ever held at once. After the run
+they are written out as .pstats files, one per test plus one merging them
+all, for pstats, snakeviz and the like. The files written are listed in a
+manifest in the directory, so that the next run can clear out just those,
+and leave alone any other profiles kept there.
+"""
+from __future__ import unicode_literals
+
+import cProfile
+import io
+import os
+import pstats
+
+MERGED_FILE_NAME = 'merged.pstats'
+
+# the names of the files written by the last run, one per line
+MANIFEST_FILE_NAME = '.junorunner-profiles'
+
+
+class SlowTestProfiler(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.profile = None
+
+    def start(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        "Stop profiling and return the profile of the test."
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        return profile
+
+    def write(self, slow_tests):
+        """
+        Write the profiles of the given SlowTests to the directory, after
+        clearing out those written by the last run, and return the paths.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.remove_written()
+
+        paths = []
+        merged = None
+        for slow_test in slow_tests:
+            if slow_test.profile is None:
+                continue
+            path = os.path.join(self.directory, slow_test.name + '.pstats')
+            stats = pstats.Stats(slow_test.profile)
+            stats.dump_stats(path)
+            paths.append(path)
+            if merged is None:
+                merged = pstats.Stats(slow_test.profile)
+            else:
+                merged.add(stats)
+
+        if merged is not None:
+            path = os.path.join(self.directory, MERGED_FILE_NAME)
+            merged.dump_stats(path)
+            paths.append(path)
+
+        with io.open(self.manifest, 'w', encoding='utf-8') as manifest:
+            manifest.writelines(
+                os.path.basename(path) + '\n' for path in paths)
+        return paths
+
+    @property
+    def manifest(self):
+        return os.path.join(self.directory, MANIFEST_FILE_NAME)
+
+    def remove_written(self):
+        "Remove the profiles listed in the manifest, if they're still there."
+        try:
+            with io.open(self.manifest, encoding='utf-8') as manifest:
+                file_names = [line.strip() for line in manifest]
+        except IOError:
+            return
+        for file_name in file_names:
+            # never anything outside the directory, whatever the manifest
+            # has been edited to say
+            if (not file_name.endswith('.pstats') or
+                    os.path.basename(file_name) != file_name):
+                continue
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except OSError:
+                pass
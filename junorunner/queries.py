@@ -0,0 +1,100 @@
+"""
+Count the SQL queries each test makes and the time spent running them.
+
+Every database connection gets an execute wrapper (Django 2.0+) for the
+length of each test. Statements are normalised, with literals and the
+length of IN lists taken out, so that the same query run over and over
+with different arguments - the tell-tale of an N+1 - shows up as one
+statement with a high count.
+"""
+from __future__ import unicode_literals
+
+import re
+import time
+from collections import Counter
+
+from django.db import connections
+
+try:
+    from contextlib import ExitStack
+except ImportError:
+    # Python 2, which no Django with execute_wrapper supports anyway
+    ExitStack = None
+
+NORMALISE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\bIN \((?:[^()]*)\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+# how many of each test's most repeated statements to keep
+REPEATED_STATEMENTS = 3
+
+
+def normalise(sql):
+    for pattern, replacement in NORMALISE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def execute_wrappers_available():
+    return ExitStack is not None and hasattr(
+        connections[list(connections)[0]], 'execute_wrapper')
+
+
+class QueryStats(object):
+    """The queries one test made, ordered by count for use in a heap."""
+    __slots__ = ('name', 'count', 'time', 'repeated')
+
+    def __init__(self, name, count, time, repeated):
+        self.name = name
+        self.count = count
+        self.time = time
+        self.repeated = repeated
+
+    def __lt__(self, other):
+        return self.count < other.count
+
+
+class QueryRecorder(object):
+    """Wrap every connection's queries between start() and stop()."""
+
+    def __init__(self):
+        self.stack = None
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.time() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def start(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+        self.stack = ExitStack()
+        for alias in connections:
+            self.stack.enter_context(connections[alias].execute_wrapper(self))
+
+    def stop(self, name):
+        "Stop recording, and return the QueryStats for the test."
+        self.stack.close()
+        self.stack = None
+
+        # normalise only now, once per distinct statement
+        normalised = Counter()
+        for sql, count in self.statements.items():
+            normalised[normalise(sql)] += count
+        repeated = [
+            (statement, count)
+            for statement, count in normalised.most_common(REPEATED_STATEMENTS)
+            if count > 1
+        ]
+        return QueryStats(name, self.count, self.time, repeated)
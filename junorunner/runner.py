@@ -1,5 +1,34 @@
+import os
+import sys
+import time
+import traceback
+from importlib import import_module
+
+try:
+    from importlib import reload
+except ImportError:
+    # Python 2, where reload is a builtin
+    pass
+
+from django.conf import settings
 from django.test.runner import DiscoverRunner
-from junorunner.extended_runner import TextTestRunner
+from junorunner.cache import FileHasher, ResultCache, test_fingerprint
+from junorunner.extended_runner import (
+    TextTestResult, TextTestRunner, iter_tests
+)
+from junorunner.dependencies import (
+    DependencyMap, DependencyTracer, changed_files, imported_files,
+    source_file
+)
+from junorunner.discovery import (
+    DiscoveryIndex, find_top_level, is_test_file, matching, module_name
+)
+from junorunner.flaky import FlakeHistory
+from junorunner.history import Baseline, DurationHistory
+from junorunner.partition import (
+    as_subsuites, case_weights, group_by_case, partition_tests, shard_tests
+)
+from junorunner.watch import FileWatcher, modules_by_file
 
 try:
     # Django 1.6
@@ -10,6 +39,10 @@ except ImportError:
 
 
 class JunoTestLoader(unittest.TestLoader):
+    # the index of the tests in each test file, while the runner is
+    # building a suite with one
+    discovery_index = None
+
     def loadTestsFromName(self, name, module=None):
         if name.startswith('unittest.loader.ModuleImportFailure'):
             name = name[36:]
@@ -17,6 +50,215 @@ class JunoTestLoader(unittest.TestLoader):
         return super(JunoTestLoader, self).loadTestsFromName(name,
                                                              module=module)
 
+    def discover(self, start_dir, pattern='test*.py', top_level_dir=None):
+        """
+        With a discovery index, leave out the test files with no tests
+        matching the test name patterns without importing them.
+        """
+        if (self.discovery_index is None or top_level_dir is None or
+                not os.path.isdir(start_dir)):
+            return super(JunoTestLoader, self).discover(
+                start_dir, pattern=pattern, top_level_dir=top_level_dir)
+        return self.suiteClass([
+            tests
+            for tests, _ in self.find_tests(start_dir, pattern, top_level_dir)
+            if tests is not None
+        ])
+
+    def find_tests(self, start_dir, pattern, top_level_dir,
+                   collect_only=False):
+        """
+        Walk start_dir the way unittest's discovery does, yielding a suite
+        and the ids of its tests for each test file and package. The suite
+        is None for the files that were left unimported: those with no
+        tests matching the test name patterns and, with collect_only, any
+        the discovery index is up to date for.
+        """
+        top_level_dir = os.path.abspath(top_level_dir)
+        if top_level_dir not in sys.path:
+            sys.path.insert(0, top_level_dir)
+
+        # like unittest, start with the package start_dir is, if it isn't
+        # the top level directory
+        if os.path.abspath(start_dir) == top_level_dir:
+            found = self.find_directory_tests(
+                start_dir, pattern, top_level_dir, collect_only)
+        else:
+            found = self.find_package_tests(
+                start_dir, pattern, top_level_dir, collect_only)
+        for tests in found:
+            yield tests
+
+    def find_directory_tests(self, directory, pattern, top_level_dir,
+                             collect_only):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                if is_test_file(name, pattern):
+                    yield self.load_test_file(
+                        path, pattern, top_level_dir, collect_only)
+            elif os.path.isfile(os.path.join(path, '__init__.py')):
+                for found in self.find_package_tests(
+                        path, pattern, top_level_dir, collect_only):
+                    yield found
+
+    def find_package_tests(self, path, pattern, top_level_dir, collect_only):
+        tests, package = self.load_module(
+            module_name(path, top_level_dir), pattern)
+        yield tests, [test.id() for test in iter_tests(tests)]
+        # a package's load_tests takes over discovery inside it, and one
+        # that failed to import has nothing inside it to discover
+        if package is not None and \
+                getattr(package, 'load_tests', None) is None:
+            for found in self.find_directory_tests(
+                    path, pattern, top_level_dir, collect_only):
+                yield found
+
+    def load_test_file(self, path, pattern, top_level_dir, collect_only):
+        patterns = getattr(self, 'testNamePatterns', None)
+        indexed = self.discovery_index.test_ids(path)
+        if indexed is not None and (
+                collect_only or not matching(indexed, patterns)):
+            return None, indexed
+
+        # load every test in the file to index them, then just the ones
+        # the patterns ask for
+        self.testNamePatterns = None
+        try:
+            tests, module = self.load_module(
+                module_name(path, top_level_dir), pattern)
+        finally:
+            self.testNamePatterns = patterns
+        test_ids = [test.id() for test in iter_tests(tests)]
+        if module is None or hasattr(module, 'load_tests'):
+            # failed to import, which the index shouldn't remember, or has
+            # its tests chosen by code that could choose others next time
+            return tests, test_ids
+
+        if test_ids != indexed:
+            own_file = os.path.relpath(path, top_level_dir)
+            self.discovery_index.record(path, test_ids, [
+                os.path.join(top_level_dir, imported)
+                for imported in imported_files(module.__name__, top_level_dir)
+                if imported != own_file
+            ])
+        if patterns:
+            tests = self.loadTestsFromModule(module, pattern=pattern)
+        return tests, test_ids
+
+    def load_module(self, name, pattern):
+        """
+        Import a test module and load its tests, returning them and the
+        module, or a test reporting why it couldn't be imported and None.
+        """
+        try:
+            module = import_module(name)
+        except unittest.SkipTest as exception:
+            return unittest.loader._make_skipped_test(
+                name, exception, self.suiteClass), None
+        except Exception:
+            tests, message = unittest.loader._make_failed_import_test(
+                name, self.suiteClass)
+            self.errors.append(message)
+            return tests, None
+        return self.loadTestsFromModule(module, pattern=pattern), module
+
+    def getLastFailedNames(self):
+        """
+        Return the dotted names of the tests that failed on the last run,
+        as listed in the rerun log.
+        """
+        try:
+            with open(TextTestResult.RERUN_LOG_FILE_NAME) as rerun_log:
+                names = [line.strip() for line in rerun_log]
+        except IOError:
+            return []
+        return [name for name in names if name]
+
+    def sortFailedFirst(self, tests, reorder_by):
+        """
+        Move the tests that failed on the last run ahead of the others,
+        without moving any test ahead of a type of test that Django runs
+        before it (TestCases before TransactionTestCases, for instance).
+        """
+        failed = set(self.getLastFailedNames())
+        buckets = {}
+        for test in tests:
+            buckets.setdefault(reorder_bucket(type(test), reorder_by),
+                               len(buckets))
+
+        def position(test):
+            bucket = buckets[reorder_bucket(type(test), reorder_by)]
+            return bucket, test.id() not in failed
+
+        return sorted(tests, key=position)
+
+
+def reorder_bucket(test_class, reorder_by):
+    "Which of Django's reorder_by groups a class of test is run in."
+    for bucket, test_type in enumerate(reorder_by):
+        if issubclass(test_class, test_type):
+            return bucket
+    return len(reorder_by)
+
+
+def label_directory(label):
+    "Return the directory a test label discovers tests in, if it does."
+    if os.path.isdir(label):
+        return label
+    try:
+        module = import_module(label)
+    except ImportError:
+        return None
+    paths = list(getattr(module, '__path__', []))
+    return paths[0] if paths else None
+
+
+def is_path_label(label):
+    "Tell a test label naming a directory or file from a dotted name."
+    return os.path.exists(os.path.abspath(label))
+
+
+def imported_module(name):
+    "Return the module a dotted name is in, or is, if it has been imported."
+    parts = name.split('.')
+    for end in range(len(parts), 0, -1):
+        module = sys.modules.get('.'.join(parts[:end]))
+        if module is not None:
+            return module
+    return None
+
+
+def label_contains(label, name):
+    "Whether a test label takes in the tests a dotted name does."
+    if is_path_label(label):
+        path = source_file(imported_module(name))
+        return path is not None and os.path.abspath(path).startswith(
+            os.path.abspath(label) + os.sep)
+    return name == label or name.startswith(label + '.')
+
+
+def narrow_labels(labels, test_labels):
+    """
+    Narrow dotted labels for tests to rerun down to those the given test
+    labels take in: a changed test module is narrowed down to the classes
+    or tests in it being watched, for instance.
+    """
+    if not test_labels:
+        return set(labels)
+    narrowed = set()
+    for label in labels:
+        if label in test_labels or any(
+                label_contains(watched, label) for watched in test_labels):
+            narrowed.add(label)
+        else:
+            narrowed.update(
+                watched for watched in test_labels
+                if not is_path_label(watched) and
+                label_contains(label, watched)
+            )
+    return narrowed
+
 
 class JunoDiscoverRunner(DiscoverRunner):
     """
@@ -24,6 +266,47 @@ class JunoDiscoverRunner(DiscoverRunner):
     DiscoverRunner in Django 1.6+ is the use of the custom
     TextTestRunner, which we hook in via run_suite()
     """
+    HISTORY_FILE_NAME = getattr(
+        settings,
+        "TEST_RUNNER_HISTORY_FILE_NAME",
+        "test_history.sqlite3"
+    )
+    RESULT_CACHE_SIZE = getattr(
+        settings,
+        "TEST_RUNNER_RESULT_CACHE_SIZE",
+        100000
+    )
+    REUSE_DB = getattr(
+        settings,
+        "TEST_RUNNER_REUSE_DB",
+        False
+    )
+    WATCH_INTERVAL = getattr(
+        settings,
+        "TEST_RUNNER_WATCH_INTERVAL",
+        1.0
+    )
+    PERF_BASELINE_RUNS = getattr(
+        settings,
+        "TEST_RUNNER_PERF_BASELINE_RUNS",
+        5
+    )
+    PERF_SLOWDOWN_RATIO = getattr(
+        settings,
+        "TEST_RUNNER_PERF_SLOWDOWN_RATIO",
+        1.5
+    )
+    PERF_SLOWDOWN_THRESHOLD = getattr(
+        settings,
+        "TEST_RUNNER_PERF_SLOWDOWN_THRESHOLD",
+        0.1
+    )
+    FIXTURE_CACHE_FILE_BYTES = getattr(
+        settings,
+        "TEST_RUNNER_FIXTURE_CACHE_FILE_BYTES",
+        256 * 1024 * 1024
+    )
+
     def get_test_count(self, suite):
         """
         When running tests in parallel, a core suite is generated to
@@ -40,10 +323,729 @@ class JunoDiscoverRunner(DiscoverRunner):
 
     test_loader = JunoTestLoader()
 
-    def run_suite(self, suite, **kwargs):
-        return TextTestRunner(
-            verbosity=self.verbosity,
+    partitions = None
+    parallel_schedule = 'static'
+    failed_first = False
+    # with --last-failed and test labels, the tests that failed last time,
+    # to keep just those of the labels' tests
+    last_failed_names = None
+    record_dependencies = False
+    changed_since = None
+    use_cache = False
+    count_queries = False
+    profile_memory = False
+    profile_slow = None
+    profile_imports = False
+    retries = 0
+    perf_baseline = False
+    fail_on_regression = False
+    cache_fixtures = False
+    shard = None
+    fingerprints = None
+    cached_tests = ()
+
+    def build_suite(self, *args, **kwargs):
+        """
+        Optionally keep just the tests that failed last time, keep just
+        this machine's shard of the suite, select just the tests affected
+        by changes since a git ref, leave out those that passed last time
+        and haven't changed since, and move the tests that failed last time
+        to the front.
+
+        Replace Django's one-sub-suite-per-class split for parallel runs
+        with one sub-suite per worker, balanced by recorded duration, or
+        with a queue of classes the workers pull from as they go.
+        """
+        # the index leaves out test files without importing them, which
+        # is only worth it when most of them have no tests to run
+        index = None
+        if getattr(self, 'test_name_patterns', None):
+            index = self.get_discovery_index()
+        self.test_loader.discovery_index = index
+        try:
+            suite = super(JunoDiscoverRunner, self).build_suite(
+                *args, **kwargs)
+        finally:
+            self.test_loader.discovery_index = None
+            if index is not None:
+                index.close()
+        tests = list(iter_tests(suite))
+        modified = False
+        if self.last_failed_names is not None:
+            tests = self.select_last_failed(tests)
+            modified = True
+        if self.shard is not None:
+            tests = self.select_shard(tests)
+            modified = True
+        if self.changed_since is not None:
+            tests = self.select_changed_tests(tests)
+            modified = True
+        if self.get_result_cache_size():
+            tests = self.skip_cached_tests(tests)
+            modified = modified or bool(self.cached_tests)
+        if self.failed_first:
+            tests = self.test_loader.sortFailedFirst(tests, self.reorder_by)
+            modified = True
+
+        if hasattr(suite, 'subsuites'):
+            if self.parallel_schedule == 'dynamic':
+                return self.dynamic_suite(suite, tests)
+            suite.subsuites = self.partition_suite(tests, suite.processes)
+        elif modified:
+            suite = suite.__class__(tests)
+        return suite
+
+    def get_discovery_index(self):
+        """
+        Open the index of the tests in each test file, kept with the
+        duration history. It relies on the loader hooks of Python 3.5+.
+        """
+        if self.HISTORY_FILE_NAME is None or sys.version_info < (3, 5):
+            return None
+        return DiscoveryIndex(self.HISTORY_FILE_NAME)
+
+    def collect_tests(self, test_labels):
+        """
+        Return the ids of the tests the labels select, taking them from the
+        discovery index for the test files that haven't changed instead of
+        importing them. Only importing the tests tells their tags, so the
+        suite is built as usual with --tag or --exclude-tag.
+        """
+        index = None
+        if not (getattr(self, 'tags', None) or
+                getattr(self, 'exclude_tags', None)):
+            index = self.get_discovery_index()
+        if index is None:
+            return [test.id()
+                    for test in iter_tests(self.build_suite(test_labels))]
+
+        self.test_loader.discovery_index = index
+        test_ids = []
+        try:
+            for label in test_labels or ['.']:
+                test_ids.extend(self.collect_label(label))
+        finally:
+            self.test_loader.discovery_index = None
+            index.close()
+        if self.last_failed_names is not None:
+            failed = set(self.last_failed_names)
+            test_ids = [test_id for test_id in test_ids if test_id in failed]
+        return matching(test_ids, getattr(self, 'test_name_patterns', None))
+
+    def collect_label(self, label):
+        directory = label_directory(label)
+        if directory is None:
+            # a test module, class or method, so there's just one module
+            # to import anyway
+            return [test.id() for test in
+                    iter_tests(self.test_loader.loadTestsFromName(label))]
+        return [
+            test_id
+            for _, test_ids in self.test_loader.find_tests(
+                directory,
+                self.pattern or 'test*.py',
+                self.top_level or find_top_level(directory),
+                collect_only=True
+            )
+            for test_id in test_ids
+        ]
+
+    def watch_tests(self, test_labels, test_ids, result):
+        """
+        Rerun the tests affected by each change to the project's Python
+        files, in the same environment and test databases, until stopped
+        with Ctrl-C. Return the result of the last run.
+
+        test_ids is the set of the ids of the tests run already, which only
+        ever grows.
+        """
+        watcher = FileWatcher(os.getcwd())
+        print("Watching for changes, press Ctrl-C to stop")
+        try:
+            while True:
+                labels = self.watched_labels(
+                    watcher.wait(self.WATCH_INTERVAL), test_labels, test_ids)
+                if not labels:
+                    continue
+                suite = self.build_suite(labels)
+                test_ids.update(test.id() for test in iter_tests(suite))
+                result = self.run_suite(suite)
+                print("Watching for changes, press Ctrl-C to stop")
+        except KeyboardInterrupt:
+            print("")
+        return result
+
+    def watched_labels(self, changed, test_labels, test_ids):
+        """
+        Reload the changed modules and the test modules affected by them,
+        and return labels for the tests to rerun: those in changed test
+        modules, and those recorded as using the other changed files, as
+        far as the labels being watched take them in. When a changed file
+        isn't known to be used by any test, every test is rerun.
+        """
+        modules = modules_by_file()
+        test_modules = set(test_id.rsplit('.', 2)[0] for test_id in test_ids)
+        label_directories = [
+            os.path.abspath(directory)
+            for directory in map(label_directory, test_labels or ['.'])
+            if directory is not None
+        ]
+
+        labels = set()
+        reload_modules = []
+        reload_tests = set()
+        changed_code = set()
+        for path in sorted(changed):
+            module = modules.get(path)
+            if module is None:
+                # new, deleted, or never imported, so only a new test
+                # module can have tests to run
+                directory = os.path.dirname(os.path.abspath(path))
+                if (os.path.exists(path) and
+                        is_test_file(os.path.basename(path),
+                                     self.pattern or 'test*.py') and
+                        any((directory + os.sep).startswith(label + os.sep)
+                            for label in label_directories)):
+                    labels.add(module_name(path, find_top_level(directory)))
+            elif module.__name__ in test_modules:
+                labels.add(module.__name__)
+                reload_tests.add(module.__name__)
+            elif (module.__name__ == settings.SETTINGS_MODULE or
+                  module.__name__.endswith('.models') or
+                  '.migrations.' in module.__name__):
+                print("%s has changed, restart the tests to pick it up" %
+                      path)
+            else:
+                reload_modules.append(module)
+                changed_code.add(path)
+
+        if changed_code:
+            affected, uncovered = self.tests_using(changed_code)
+            if uncovered:
+                print("No recorded test uses %s, rerunning all tests" %
+                      ", ".join(sorted(uncovered)))
+                labels = set(test_labels or ['.'])
+                reload_tests = test_modules
+            else:
+                affected = set(test_id for test_id in affected
+                               if test_id in test_ids)
+                labels.update(affected)
+                reload_tests.update(test_id.rsplit('.', 2)[0]
+                                    for test_id in affected)
+
+        # the changed code first, then the test modules using it, so that
+        # they import the new version
+        reload_modules.extend(
+            sys.modules[name] for name in sorted(reload_tests)
+            if name in sys.modules
+        )
+        try:
+            for module in reload_modules:
+                reload(module)
+        except Exception:
+            traceback.print_exc()
+            return []
+        # just the tests being watched, leaving out those whose whole class
+        # or module is being run
+        labels = narrow_labels(labels, test_labels)
+        return sorted(
+            label for label in labels
+            if not any(label.startswith(other + '.') for other in labels)
+        )
+
+    def tests_using(self, paths):
+        """
+        Return the ids of the tests recorded as using any of the files, and
+        the files not recorded as used by any test.
+        """
+        if self.HISTORY_FILE_NAME is None:
+            return set(), paths
+        dependency_map = DependencyMap(self.HISTORY_FILE_NAME)
+        affected = dependency_map.tests_using(paths)
+        uncovered = paths - dependency_map.recorded_files(paths)
+        dependency_map.close()
+        return affected, uncovered
+
+    def select_last_failed(self, tests):
+        "Keep the tests listed in the rerun log as having failed last time."
+        failed = set(self.last_failed_names)
+        selected = [test for test in tests if test.id() in failed]
+        print("Running the %i of %i tests that failed last time" % (
+            len(selected), len(tests)))
+        return selected
+
+    def select_shard(self, tests):
+        """
+        Keep the TestCase classes in shard self.shard, an (index, count)
+        pair, balanced between the shards by recorded duration.
+        """
+        index, count = self.shard
+        selected = shard_tests(tests, index, count, self.recorded_durations())
+        print("Shard %i of %i, running %i of %i tests" % (
+            index, count, len(selected), len(tests)))
+        return selected
+
+    def select_changed_tests(self, tests):
+        """
+        Keep the tests that used a file changed since self.changed_since
+        when their dependencies were recorded, and any test whose
+        dependencies have never been recorded.
+        """
+        if self.HISTORY_FILE_NAME is None:
+            print("--changed-since needs TEST_RUNNER_HISTORY_FILE_NAME, "
+                  "running all tests")
+            return tests
+
+        changed = changed_files(self.changed_since)
+        dependency_map = DependencyMap(self.HISTORY_FILE_NAME)
+        recorded = dependency_map.recorded_tests()
+        affected = dependency_map.tests_using(changed)
+        unknown = changed - dependency_map.recorded_files(changed)
+        dependency_map.close()
+
+        selected = [
+            test for test in tests
+            if test.id() in affected or test.id() not in recorded
+        ]
+        print("%i files changed since %s, running %i of %i tests" % (
+            len(changed), self.changed_since, len(selected), len(tests)))
+        unknown = sorted(path for path in unknown if path.endswith('.py'))
+        if unknown:
+            print("No recorded test uses these changed files:")
+            for path in unknown:
+                print("    %s" % path)
+        return selected
+
+    def recorded_durations(self):
+        history = self.get_history()
+        if history is None:
+            return {}
+        durations = history.durations()
+        history.close()
+        return durations
+
+    def dynamic_suite(self, suite, tests):
+        """
+        Queue up the classes heaviest first, so the long ones are started
+        early and the end of the run is spent on short ones, while keeping
+        TestCases ahead of TransactionTestCases as Django orders them.
+
+        With --failed-first, classes with a test that failed last time
+        are queued ahead of the rest.
+        """
+        from junorunner.parallel import DynamicTestSuite, fork_available
+
+        if not fork_available():
+            print("The dynamic parallel schedule needs forked workers and "
+                  "Python 3.3+, falling back to the static one")
+            suite.subsuites = self.partition_suite(tests, suite.processes)
+            return suite
+
+        groups = group_by_case(tests)
+        weights = case_weights(groups, self.recorded_durations())
+        failed = set()
+        if self.failed_first:
+            failed = set(self.test_loader.getLastFailedNames())
+
+        def queue_position(position):
+            group = groups[position]
+            return (
+                reorder_bucket(type(group[0]), self.reorder_by),
+                not any(test.id() in failed for test in group),
+                -weights[position]
+            )
+
+        positions = sorted(range(len(groups)), key=queue_position)
+        return DynamicTestSuite(
+            [unittest.TestSuite(groups[position]) for position in positions],
+            suite.processes,
             failfast=self.failfast,
-            total_tests=self.get_test_count(suite),
-            slow_test_count=self.slow_test_count
-        ).run(suite)
+            buffer=getattr(self, 'buffer', False)
+        )
+
+    def partition_suite(self, tests, processes):
+        durations = self.recorded_durations()
+
+        self.partitions = partition_tests(tests, processes, durations)
+        if not durations:
+            # the split was by test count, so there's no time to predict
+            for partition in self.partitions:
+                partition.predicted = None
+        return as_subsuites(self.partitions)
+
+    def get_history(self):
+        """
+        Open the store of per-test durations from previous runs, unless it
+        has been disabled by setting TEST_RUNNER_HISTORY_FILE_NAME to None.
+        """
+        if self.HISTORY_FILE_NAME is None:
+            return None
+        return DurationHistory(self.HISTORY_FILE_NAME,
+                               self.PERF_BASELINE_RUNS)
+
+    def get_perf_baseline(self, suite, history):
+        """
+        Return the baseline to compare each test's duration with, if asked
+        to and if it can: it needs the history, and the tests to be timed
+        as they run, which Django's parallel runs don't do. Tests need at
+        least three recorded runs (or all of PERF_BASELINE_RUNS, if fewer)
+        to have a baseline.
+        """
+        if not self.perf_baseline:
+            return None
+        if history is None:
+            print("There's no baseline without the history file, "
+                  "not comparing test durations")
+            return None
+        if getattr(self, 'parallel', 1) > 1 and \
+                not getattr(suite, 'reports_durations', False):
+            print("Tests aren't timed individually in static parallel "
+                  "runs, not comparing test durations")
+            return None
+        return Baseline(
+            history.baselines(min(3, self.PERF_BASELINE_RUNS)),
+            self.PERF_SLOWDOWN_RATIO,
+            self.PERF_SLOWDOWN_THRESHOLD
+        )
+
+    def get_result_cache_size(self):
+        """
+        The number of test results to keep in the cache, or 0 if there is
+        no cache: it is turned on by --cache, unless
+        TEST_RUNNER_RESULT_CACHE_SIZE is None, and needs the history.
+        """
+        if not self.use_cache or self.HISTORY_FILE_NAME is None:
+            return 0
+        return self.RESULT_CACHE_SIZE or 0
+
+    def skip_cached_tests(self, tests):
+        """
+        Leave out the tests that passed last time when neither their module
+        nor any of their recorded dependencies have changed.
+        """
+        dependency_map = DependencyMap(self.HISTORY_FILE_NAME)
+        dependencies = dependency_map.dependencies()
+        dependency_map.close()
+
+        hash_file = FileHasher()
+        self.fingerprints = dict(
+            (test.id(),
+             test_fingerprint(test, dependencies[test.id()], hash_file))
+            for test in tests if test.id() in dependencies
+        )
+
+        result_cache = ResultCache(
+            self.HISTORY_FILE_NAME, self.get_result_cache_size())
+        passed = result_cache.passed(self.fingerprints)
+        result_cache.close()
+
+        self.cached_tests = [test for test in tests if test.id() in passed]
+        if self.cached_tests:
+            print("%i unchanged tests passed last time, not running them "
+                  "(leave out --cache to run them anyway)" %
+                  len(self.cached_tests))
+        return [test for test in tests if test.id() not in passed]
+
+    def reuse_databases(self):
+        """
+        Whether to keep the test databases between runs, checking that
+        their schema is still current: with --keepdb or if
+        TEST_RUNNER_REUSE_DB is set, provided there is a history to store
+        the schema fingerprint in and Django supports keepdb (1.8+).
+        """
+        return (
+            hasattr(self, 'keepdb') and
+            self.HISTORY_FILE_NAME is not None and
+            (self.keepdb or self.REUSE_DB)
+        )
+
+    def setup_databases(self, **kwargs):
+        """
+        Reuse the test databases kept from the last run if the models and
+        migrations they were built from haven't changed, and otherwise
+        rebuild them and keep them for next time.
+        """
+        if not self.reuse_databases():
+            return super(JunoDiscoverRunner, self).setup_databases(**kwargs)
+
+        from junorunner.databases import SchemaStore, schema_fingerprint
+
+        store = SchemaStore(self.HISTORY_FILE_NAME)
+        fingerprint = schema_fingerprint()
+        kept_fingerprint, full_setup_time = store.get()
+        reuse = fingerprint == kept_fingerprint
+
+        interactive = self.interactive
+        self.keepdb = reuse
+        if not reuse:
+            # the databases in the way are the ones we kept last time
+            self.interactive = False
+        start = time.time()
+        try:
+            old_config = super(JunoDiscoverRunner, self).setup_databases(
+                **kwargs)
+        finally:
+            self.interactive = interactive
+            self.keepdb = True
+        setup_time = time.time() - start
+
+        if reuse:
+            print("Reused the test databases, the schema is unchanged "
+                  "(saved %.1fs)" % max(full_setup_time - setup_time, 0))
+        else:
+            store.set(fingerprint, setup_time)
+            print("Built the test databases for a new schema in %.1fs, "
+                  "keeping them for next time" % setup_time)
+        store.close()
+        return old_config
+
+    def get_dependency_tracer(self):
+        """
+        Return a tracer to record the files each test uses with, if asked
+        to and if it can: the files are stored with the duration history,
+        and the tests have to run in this process.
+        """
+        if not self.record_dependencies:
+            return None
+        if self.HISTORY_FILE_NAME is None:
+            print("Recording test dependencies needs "
+                  "TEST_RUNNER_HISTORY_FILE_NAME, not recording them")
+            return None
+        if getattr(self, 'parallel', 1) > 1:
+            print("Test dependencies can't be recorded in parallel runs, "
+                  "not recording them")
+            return None
+        return DependencyTracer()
+
+    def get_query_recorder(self):
+        """
+        Return a recorder to count each test's queries with, if asked to
+        and if it can: it needs Django's execute wrappers (2.0+) and the
+        tests to run in this process.
+        """
+        if not self.count_queries:
+            return None
+
+        from junorunner.queries import (
+            QueryRecorder, execute_wrappers_available
+        )
+
+        if not execute_wrappers_available():
+            print("Counting queries needs Django 2.0 or later, "
+                  "not counting them")
+            return None
+        if getattr(self, 'parallel', 1) > 1:
+            print("Queries can't be counted in parallel runs, "
+                  "not counting them")
+            return None
+        return QueryRecorder()
+
+    def get_memory_profiler(self):
+        """
+        Return a profiler to track each test's memory with, if asked to and
+        if it can: it needs tracemalloc (Python 3.4+) and the tests to run
+        in this process.
+        """
+        if not self.profile_memory:
+            return None
+
+        from junorunner.memory import MemoryProfiler
+
+        if not MemoryProfiler.available():
+            print("Profiling memory needs tracemalloc, not profiling it")
+            return None
+        if getattr(self, 'parallel', 1) > 1:
+            print("Memory can't be profiled in parallel runs, "
+                  "not profiling it")
+            return None
+        return MemoryProfiler()
+
+    def get_import_profiler(self):
+        "Return a profiler to time imports with, if asked to and if it can."
+        if not self.profile_imports:
+            return None
+
+        from junorunner.imports import ImportProfiler
+
+        if not ImportProfiler.available():
+            print("Imports can only be profiled on Python 3.4+, "
+                  "not profiling them")
+            return None
+        return ImportProfiler()
+
+    def report_imports(self, import_profiler):
+        """
+        Stop timing imports, and list the slowest modules and the modules
+        that pulled in the most import time.
+        """
+        if import_profiler is None:
+            return
+        import_profiler.stop()
+        count = self.slow_test_count or 10
+
+        print("Imports took %.3fs while setting up and finding tests" %
+              import_profiler.total)
+        print("Slowest imports (cumulative, self): ")
+        for entry in import_profiler.slowest(count):
+            print("    %.3fs, %.3fs %s%s" % (
+                entry.cumulative, entry.self_time, entry.name,
+                "" if entry.root == entry.name else
+                " (pulled in by %s)" % entry.root
+            ))
+        print("Most import time pulled in by: ")
+        for name, elapsed in import_profiler.slowest_roots(count):
+            print("    %.3fs %s" % (elapsed, name))
+
+    def get_slow_test_profiler(self):
+        """
+        Return a profiler to keep the profiles of the slowest tests with,
+        if asked to and if it can: it needs the tests to run in this
+        process, and can't share them with --record-dependencies, which
+        uses the same interpreter hook.
+        """
+        if self.profile_slow is None:
+            return None
+
+        from junorunner.profiling import SlowTestProfiler
+
+        if getattr(self, 'parallel', 1) > 1:
+            print("Tests can't be profiled in parallel runs, "
+                  "not profiling them")
+            return None
+        if self.record_dependencies:
+            print("Tests can't be profiled while recording their "
+                  "dependencies, not profiling them")
+            return None
+        return SlowTestProfiler(self.profile_slow)
+
+    def record_flakes(self, result):
+        """
+        Count the run towards each test's flake rate, which is only known
+        when failures are retried, and list how often the flaky tests have
+        been flaky before.
+        """
+        flake_history = FlakeHistory(self.HISTORY_FILE_NAME)
+        flake_history.record(result.outcomes())
+        if result.flaky:
+            print("Flakiest tests: ")
+            for test_id, runs, flaky in flake_history.flakiest(
+                    result.report_count):
+                print("{0} : flaky in {1} of {2} runs ({3:.0%})".format(
+                    test_id, flaky, runs, float(flaky) / runs))
+        flake_history.close()
+
+    def get_setup_timer(self, suite):
+        """
+        Return a timer installed on the TestCase classes in the suite, to
+        time their setup, teardown and fixtures alongside the slow tests.
+        They can only be timed when they run in this process.
+        """
+        if not self.slow_test_count or getattr(self, 'parallel', 1) > 1:
+            return None
+
+        from junorunner.class_setup import ClassSetupTimer
+
+        setup_timer = ClassSetupTimer()
+        setup_timer.install(set(
+            type(test) for test in iter_tests(suite)
+            if isinstance(test, unittest.TestCase)
+        ))
+        return setup_timer
+
+    def get_fixture_cache(self):
+        """
+        Return a cache of the parsed fixture files, if asked for one and
+        if it can: the fixtures need to be loaded in this process.
+        """
+        if not self.cache_fixtures:
+            return None
+
+        from junorunner.fixtures import FixtureCache
+
+        if getattr(self, 'parallel', 1) > 1:
+            print("Fixtures can't be cached in parallel runs, "
+                  "not caching them")
+            return None
+        return FixtureCache(self.FIXTURE_CACHE_FILE_BYTES)
+
+    def report_fixture_cache(self, fixture_cache):
+        if fixture_cache is None:
+            return
+        print("Fixture cache: %i hits, %i misses, %i evicted, "
+              "%.3fs of parsing saved" % (
+                  fixture_cache.hits, fixture_cache.misses,
+                  fixture_cache.evictions, fixture_cache.time_saved))
+
+    def run_suite(self, suite, **kwargs):
+        history = self.get_history()
+        dependency_tracer = self.get_dependency_tracer()
+        setup_timer = self.get_setup_timer(suite)
+        fixture_cache = self.get_fixture_cache()
+        query_recorder = self.get_query_recorder()
+        memory_profiler = self.get_memory_profiler()
+        slow_test_profiler = self.get_slow_test_profiler()
+        if fixture_cache is not None:
+            fixture_cache.install()
+        try:
+            result = TextTestRunner(
+                verbosity=self.verbosity,
+                failfast=self.failfast,
+                total_tests=self.get_test_count(suite),
+                slow_test_count=self.slow_test_count,
+                history=history,
+                partitions=self.partitions,
+                dependency_tracer=dependency_tracer,
+                cached_count=len(self.cached_tests),
+                query_recorder=query_recorder,
+                memory_profiler=memory_profiler,
+                slow_test_profiler=slow_test_profiler,
+                retries=self.retries,
+                baseline=self.get_perf_baseline(suite, history),
+                setup_timer=setup_timer,
+                fail_on_regression=self.fail_on_regression
+            ).run(suite)
+        finally:
+            if setup_timer is not None:
+                setup_timer.uninstall()
+            if fixture_cache is not None:
+                fixture_cache.uninstall()
+        self.report_fixture_cache(fixture_cache)
+
+        if self.retries and self.HISTORY_FILE_NAME is not None:
+            self.record_flakes(result)
+
+        if self.fingerprints:
+            result_cache = ResultCache(
+                self.HISTORY_FILE_NAME, self.get_result_cache_size())
+            result_cache.record(result.outcomes(), self.fingerprints)
+            result_cache.close()
+
+        if dependency_tracer is not None:
+            dependency_map = DependencyMap(self.HISTORY_FILE_NAME)
+            dependency_map.record(result.dependencies)
+            dependency_map.close()
+
+        if history is not None:
+            # Django's parallel results are replayed in bulk once each
+            # sub-suite has finished, so the timings seen here are
+            # meaningless unless the suite timed the tests itself, and
+            # instrumented tests run slower than they would otherwise
+            instrumented = any(
+                instrument is not None for instrument in (
+                    dependency_tracer, query_recorder, memory_profiler,
+                    slow_test_profiler)
+            )
+            if not instrumented and (
+                    getattr(self, 'parallel', 1) <= 1 or
+                    getattr(suite, 'reports_durations', False)):
+                history.record(result.durations)
+            history.close()
+        return result
+
+    def suite_result(self, suite, result, **kwargs):
+        "Count the tests that got slower as failures too, if asked to."
+        failures = super(JunoDiscoverRunner, self).suite_result(
+            suite, result, **kwargs)
+        if self.fail_on_regression:
+            failures += len(result.regressions)
+        return failures
@@ -0,0 +1,83 @@
+"""
+Show the progress of a run on a single line, redrawn in place.
+
+Writing and flushing a couple of lines per test adds up to a lot of
+output, and on a slow terminal the run ends up waiting on it. Instead, a
+background thread redraws one status line at a fixed rate, however many
+tests have finished in between. Anything else written to the stream while
+the status line is up has to go through paused(), so the two don't end up
+on the same line.
+"""
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+try:
+    from shutil import get_terminal_size
+except ImportError:
+    # Python 2
+    get_terminal_size = None
+
+# carriage return, then erase to the end of the line
+CLEAR_LINE = '\r\033[K'
+
+
+def terminal_width():
+    if get_terminal_size is None:
+        return 80
+    return get_terminal_size().columns
+
+
+class StatusLine(object):
+
+    def __init__(self, stream, render, interval):
+        self.stream = stream
+        self.render = render
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._shown = False
+
+    @staticmethod
+    def supported(stream):
+        "Whether the stream is a terminal, which can redraw a line."
+        isatty = getattr(stream, 'isatty', None)
+        return isatty is not None and isatty()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        "Stop redrawing and clear the status line away."
+        self._stopped.set()
+        self._thread.join()
+        with self.paused():
+            self.stream.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.redraw()
+
+    def redraw(self):
+        # keep it short of the last column, so it can't wrap
+        line = self.render()[:terminal_width() - 1]
+        with self.lock:
+            self.stream.write(CLEAR_LINE + line)
+            self.stream.flush()
+            self._shown = True
+
+    @contextmanager
+    def paused(self):
+        """
+        Clear the status line and hold off redrawing it while other output
+        is written. It is drawn again on the next tick, below that output.
+        """
+        with self.lock:
+            if self._shown:
+                self.stream.write(CLEAR_LINE)
+                self._shown = False
+            yield
@@ -1,5 +1,7 @@
 from __future__ import print_function
 
+from .partition import parse_shard
+from .extended_runner import iter_tests
 from .runner import JunoDiscoverRunner
 
 
@@ -18,6 +20,26 @@ class TestSuiteRunner(JunoDiscoverRunner):
 
     def __init__(self, *args, **kwargs):
         self.slow_test_count = int(kwargs.get('slow_test_count', 0))
+        self.parallel_schedule = kwargs.get('parallel_schedule', 'static')
+        self.last_failed = kwargs.get('last_failed', False)
+        self.failed_first = kwargs.get('failed_first', False)
+        self.record_dependencies = kwargs.get('record_dependencies', False)
+        self.changed_since = kwargs.get('changed_since', None)
+        self.use_cache = kwargs.get('use_cache', False)
+        self.count_queries = kwargs.get('count_queries', False)
+        self.profile_memory = kwargs.get('profile_memory', False)
+        self.profile_slow = kwargs.get('profile_slow', None)
+        if self.profile_slow is not None and not self.slow_test_count:
+            self.slow_test_count = 10
+        self.shard = kwargs.get('shard', None)
+        self.collect_only = kwargs.get('collect_only', False)
+        self.profile_imports = kwargs.get('profile_imports', False)
+        self.watch = kwargs.get('watch', False)
+        self.retries = int(kwargs.get('retries', 0))
+        self.fail_on_regression = kwargs.get('fail_on_regression', False)
+        self.perf_baseline = (kwargs.get('perf_baseline', False) or
+                              self.fail_on_regression)
+        self.cache_fixtures = kwargs.get('cache_fixtures', False)
         super(TestSuiteRunner, self).__init__(*args, **kwargs)
 
     @classmethod
@@ -28,19 +50,178 @@ class TestSuiteRunner(JunoDiscoverRunner):
                             dest='slow_test_count',
                             default=0,
                             help="Print given number of slowest tests")
+        parser.add_argument('--parallel-schedule',
+                            action='store',
+                            dest='parallel_schedule',
+                            choices=['static', 'dynamic'],
+                            default='static',
+                            help="With --parallel, either split the tests "
+                                 "between the workers up front (static), "
+                                 "or have the workers take one TestCase "
+                                 "class at a time as they go (dynamic)")
+        parser.add_argument('--last-failed',
+                            action='store_true',
+                            dest='last_failed',
+                            default=False,
+                            help="Only run the tests listed in the rerun "
+                                 "log, i.e. those that failed last time")
+        parser.add_argument('--failed-first',
+                            action='store_true',
+                            dest='failed_first',
+                            default=False,
+                            help="Run the tests that failed last time "
+                                 "before the rest of the suite")
+        parser.add_argument('--record-dependencies',
+                            action='store_true',
+                            dest='record_dependencies',
+                            default=False,
+                            help="Record which project files each test "
+                                 "uses, for --changed-since")
+        parser.add_argument('--changed-since',
+                            action='store',
+                            dest='changed_since',
+                            default=None,
+                            metavar='GIT_REF',
+                            help="Only run the tests that used files which "
+                                 "have changed since the given git ref, "
+                                 "and tests with no recorded dependencies")
+        parser.add_argument('--cache',
+                            action='store_true',
+                            dest='use_cache',
+                            default=False,
+                            help="Leave out the tests that passed last time "
+                                 "if none of their recorded dependencies "
+                                 "have changed")
+        parser.add_argument('--queries',
+                            action='store_true',
+                            dest='count_queries',
+                            default=False,
+                            help="Count the SQL queries each test makes "
+                                 "and the time spent on them, and list the "
+                                 "tests that make the most")
+        parser.add_argument('--memory',
+                            action='store_true',
+                            dest='profile_memory',
+                            default=False,
+                            help="Track the memory each test allocates and "
+                                 "keeps hold of, and list the tests and "
+                                 "modules that keep the most")
+        parser.add_argument('--profile-slow',
+                            action='store',
+                            dest='profile_slow',
+                            nargs='?',
+                            const='test_profiles',
+                            default=None,
+                            metavar='DIRECTORY',
+                            help="Profile every test, and write the "
+                                 "profiles of the --slow-tests slowest (10 "
+                                 "by default) to DIRECTORY as .pstats files "
+                                 "(default: test_profiles)")
+        parser.add_argument('--shard',
+                            action='store',
+                            dest='shard',
+                            type=parse_shard,
+                            default=None,
+                            metavar='INDEX/COUNT',
+                            help="Only run shard INDEX (counting from 1) "
+                                 "of COUNT, splitting the TestCase classes "
+                                 "between the shards by recorded duration")
+        parser.add_argument('--collect-only',
+                            action='store_true',
+                            dest='collect_only',
+                            default=False,
+                            help="List the tests that would be run, "
+                                 "without running them, importing only the "
+                                 "test modules changed since last time")
+        parser.add_argument('--profile-imports',
+                            action='store_true',
+                            dest='profile_imports',
+                            default=False,
+                            help="Time the imports made while setting up "
+                                 "and finding the tests, and list the "
+                                 "slowest, and the modules pulling them in")
+        parser.add_argument('--watch',
+                            action='store_true',
+                            dest='watch',
+                            default=False,
+                            help="After running the tests, keep the test "
+                                 "databases and rerun the tests affected by "
+                                 "each change to the project's Python files")
+        parser.add_argument('--retries',
+                            action='store',
+                            dest='retries',
+                            type=int,
+                            default=0,
+                            metavar='N',
+                            help="Once the run is over, run each failed "
+                                 "test again on its own up to N times, "
+                                 "counting those that then pass as flaky "
+                                 "rather than failed")
+        parser.add_argument('--perf-baseline',
+                            action='store_true',
+                            dest='perf_baseline',
+                            default=False,
+                            help="Compare each test's duration with the "
+                                 "median of its last few recorded runs, "
+                                 "and list the tests that got slower")
+        parser.add_argument('--fail-on-regression',
+                            action='store_true',
+                            dest='fail_on_regression',
+                            default=False,
+                            help="As --perf-baseline, and fail the run if "
+                                 "any test got slower")
+        parser.add_argument('--cache-fixtures',
+                            action='store_true',
+                            dest='cache_fixtures',
+                            default=False,
+                            help="Parse each JSON or YAML fixture file once, "
+                                 "rather than for every TestCase class that "
+                                 "loads it")
 
     def run_tests(self, test_labels, extra_tests=None, **kwargs):
         """
         Run the unit tests for all the test labels in the provided list.
         """
 
+        import_profiler = self.get_import_profiler()
+        if import_profiler is not None:
+            import_profiler.start()
+
         self.setup_test_environment()
+
+        if self.last_failed:
+            last_failed = self.test_loader.getLastFailedNames()
+            if not last_failed:
+                print("No failed tests in the rerun log, running them all")
+            elif test_labels:
+                # just those of the tests the labels take in
+                self.last_failed_names = last_failed
+            else:
+                print("Running the %i tests that failed last time" %
+                      len(last_failed))
+                test_labels = last_failed
+
+        if self.collect_only:
+            test_ids = self.collect_tests(test_labels)
+            self.report_imports(import_profiler)
+            for test_id in test_ids:
+                print(test_id)
+            print("%i tests found" % len(test_ids))
+            self.teardown_test_environment()
+            return 0
+
         suite = self.build_suite(test_labels, extra_tests)
+        self.report_imports(import_profiler)
 
         print("%i tests found" % self.get_test_count(suite))
 
         old_config = self.setup_databases()
+        if self.watch:
+            # taken before the suite lets go of its tests as they run
+            test_ids = set(test.id() for test in iter_tests(suite))
         result = self.run_suite(suite)
+        if self.watch:
+            result = self.watch_tests(test_labels, test_ids, result)
         self.teardown_databases(old_config)
         self.teardown_test_environment()
         return self.suite_result(suite, result)
@@ -0,0 +1,72 @@
+"""
+Notice changes to a project's Python files, for rerunning tests on save.
+
+The tree is polled by modification time, which needs nothing beyond the
+standard library and copes with editors that save by replacing a file.
+"""
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+
+# directories never worth walking into
+SKIP_DIRECTORIES = ('__pycache__', 'node_modules', 'site-packages')
+
+
+def python_files(root):
+    "Return a dict of the path of each Python file under root -> mtime."
+    files = {}
+    for directory, directories, names in os.walk(root):
+        directories[:] = [
+            name for name in directories
+            if not name.startswith('.') and name not in SKIP_DIRECTORIES
+        ]
+        for name in names:
+            if name.endswith('.py'):
+                path = os.path.relpath(os.path.join(directory, name), root)
+                try:
+                    files[path] = os.path.getmtime(os.path.join(root, path))
+                except OSError:
+                    # deleted while we looked
+                    pass
+    return files
+
+
+def modules_by_file():
+    "Return a dict of the relative path of each imported module -> module."
+    modules = {}
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path is None:
+            continue
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        modules[os.path.relpath(path)] = module
+    return modules
+
+
+class FileWatcher(object):
+
+    def __init__(self, root):
+        self.root = root
+        self.files = python_files(root)
+
+    def changes(self):
+        "Return the files added, changed or deleted since last time."
+        files = python_files(self.root)
+        changed = set(
+            path for path, mtime in files.items()
+            if self.files.get(path) != mtime
+        )
+        changed.update(set(self.files) - set(files))
+        self.files = files
+        return changed
+
+    def wait(self, interval):
+        "Poll every interval seconds until some files change, and return them."
+        while True:
+            time.sleep(interval)
+            changed = self.changes()
+            if changed:
+                return changed
@@ -15,7 +15,11 @@ setup(
     author_email='steve@somefantastic.co.uk, hugo@yunojuno.com',
     url='https://github.com/yunojuno/django-juno-testrunner.git',
     license='MIT',
-    packages=['junorunner'],
+    packages=[
+        'junorunner',
+        'junorunner.management',
+        'junorunner.management.commands',
+    ],
     install_requires=['colorama'],
     extras_require={'junorunner': ['colorama', ]},
     classifiers=[
@@ -1,4 +1,111 @@
-from django.test import TestCase, TransactionTestCase
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from contextlib import contextmanager, redirect_stdout
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.runner import DiscoverRunner
+
+from junorunner.cache import FileHasher, ResultCache, test_fingerprint
+from junorunner.class_setup import ClassSetupTimer
+from junorunner.databases import SchemaStore, schema_files, schema_fingerprint
+from junorunner.dependencies import (
+    DependencyTracer, changed_files, project_file,
+)
+from junorunner.discovery import DiscoveryIndex
+from junorunner.events import EventLog
+from junorunner.history import Baseline, DurationHistory
+from junorunner.imports import ImportProfiler
+from junorunner.junit import JUnitWriter
+from junorunner.memory import MemoryProfiler, format_size
+from junorunner.management.commands.merge_shards import Command as MergeShards
+from junorunner.parallel import DynamicTestSuite, fork_available
+from junorunner.partition import parse_shard, partition_tests, shard_tests
+from junorunner.profiling import SlowTestProfiler
+from junorunner.queries import QueryRecorder, normalise
+from junorunner.status import CLEAR_LINE, StatusLine
+from junorunner.extended_runner import (
+    SlowTest, TextTestResult, TextTestRunner, _WritelnDecorator, iter_tests,
+    push_bounded,
+)
+from junorunner.runner import JunoDiscoverRunner, JunoTestLoader
+from junorunner.testrunner import TestSuiteRunner
+
+
+@contextmanager
+def temporary_package(name, modules):
+    """
+    Write a package of the given modules, a dict of file name -> source,
+    to a temporary directory that is the current directory and importable
+    for the length of the block.
+    """
+    directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+    os.mkdir(os.path.join(directory, name))
+    modules = dict(modules)
+    modules.setdefault('__init__.py', '')
+    for file_name, source in modules.items():
+        with open(os.path.join(directory, name, file_name), 'w') as module:
+            module.write(source)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    try:
+        yield directory
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(directory)
+        for module_name in list(sys.modules):
+            if module_name == name or module_name.startswith(name + '.'):
+                del sys.modules[module_name]
+        shutil.rmtree(directory)
+
+
+def run_tests(tests, result_settings=None, **kwargs):
+    """
+    Run a suite, or the tests in a TestCase class, with junorunner's
+    TextTestRunner, writing its logs to a temporary directory instead of
+    over those of the run in progress. Settings of the result class can be
+    overridden by a dict of attribute -> value. Return the result and the
+    output.
+    """
+    if isinstance(tests, type):
+        tests = unittest.defaultTestLoader.loadTestsFromTestCase(tests)
+    directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+
+    class QuietTestResult(TextTestResult):
+        RERUN_LOG_FILE_NAME = os.path.join(directory, 'test_rerun.txt')
+        FAILURE_LIST_FILENAME = os.path.join(directory, 'test_failures.txt')
+        JUNIT_FILE = None
+        EVENT_LOG_FILE_NAME = None
+        STATUS_LINE = False
+
+    for name, value in (result_settings or {}).items():
+        setattr(QuietTestResult, name, value)
+    stream = StringIO()
+    try:
+        result = TextTestRunner(
+            stream=stream,
+            resultclass=QuietTestResult,
+            total_tests=tests.countTestCases(),
+            **kwargs
+        ).run(tests)
+    finally:
+        shutil.rmtree(directory)
+    return result, stream.getvalue()
 
 
 class JunorunnerTestCase(TestCase):
@@ -19,3 +126,1246 @@ class JunorunnerTransactionTestCase(TransactionTestCase):
 
     def test_can_run_transaction_bound_tests(self):
         pass
+
+
+class DependencyTests(SimpleTestCase):
+
+    def test_project_file_rejects_names_that_are_not_files(self):
+        root = os.getcwd()
+        self.assertIsNone(project_file('<frozen importlib._bootstrap>', root))
+        self.assertIsNone(project_file('<string>', root))
+        self.assertIsNone(
+            project_file(os.path.join(root, 'no_such_module.py'), root))
+        self.assertEqual(
+            project_file(os.path.join(root, 'manage.py'), root), 'manage.py')
+
+    def test_records_the_modules_a_test_module_imports_from(self):
+        with temporary_package('imported_deps', {
+            'models.py': "class Thing(object):\n    colour = 'red'\n",
+            'helpers.py': "def unused():\n    pass\n",
+            'tests.py': (
+                "from imported_deps.models import Thing\n\n\n"
+                "def colour():\n    return Thing.colour\n"
+            ),
+        }) as directory:
+            tests = import_module('imported_deps.tests')
+            import_module('imported_deps.helpers')
+            tracer = DependencyTracer(directory)
+            tracer.start()
+            tests.colour()
+            files = tracer.stop('imported_deps.tests')
+
+        # models.py only ran at import time, so the profiling hook never
+        # saw it, and nothing uses helpers.py
+        self.assertEqual(files, set([
+            os.path.join('imported_deps', '__init__.py'),
+            os.path.join('imported_deps', 'models.py'),
+            os.path.join('imported_deps', 'tests.py'),
+        ]))
+
+    def test_a_bad_ref_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, 'no-such-ref'):
+            changed_files('no-such-ref')
+        with mock.patch('subprocess.check_output',
+                        side_effect=OSError("No such file or directory")):
+            with self.assertRaisesMessage(CommandError, "Can't run git"):
+                changed_files('HEAD')
+
+
+class ResultCacheTests(SimpleTestCase):
+
+    def test_a_failing_subtest_fails_its_test(self):
+        class SubTests(unittest.TestCase):
+            def test_numbers(self):
+                for number in range(3):
+                    with self.subTest(number=number):
+                        self.assertNotEqual(number, 1)
+
+            def test_passes(self):
+                pass
+
+        outcomes = run_tests(SubTests)[0].outcomes()
+        self.assertEqual(outcomes, {
+            SubTests('test_numbers').id(): 'failure',
+            SubTests('test_passes').id(): 'success',
+        })
+
+    def test_a_class_teardown_error_fails_the_tests_in_the_class(self):
+        class BrokenTeardown(unittest.TestCase):
+            @classmethod
+            def tearDownClass(cls):
+                raise RuntimeError("teardown failed")
+
+            def test_one(self):
+                pass
+
+            def test_two(self):
+                pass
+
+        class BrokenTeardownNeighbour(unittest.TestCase):
+            def test_three(self):
+                pass
+
+        suite = unittest.TestSuite([
+            unittest.defaultTestLoader.loadTestsFromTestCase(case)
+            for case in (BrokenTeardown, BrokenTeardownNeighbour)
+        ])
+        outcomes = run_tests(suite)[0].outcomes()
+        self.assertEqual(outcomes, {
+            BrokenTeardown('test_one').id(): 'error',
+            BrokenTeardown('test_two').id(): 'error',
+            BrokenTeardownNeighbour('test_three').id(): 'success',
+        })
+
+    def test_changing_an_imported_model_invalidates_the_result(self):
+        with temporary_package('model_change', {
+            'models.py': "class Thing(object):\n    colour = 'red'\n",
+            'tests.py': (
+                "import unittest\n\n"
+                "from model_change.models import Thing\n\n\n"
+                "class ThingTests(unittest.TestCase):\n"
+                "    def test_colour(self):\n"
+                "        self.assertEqual(Thing.colour, 'red')\n"
+            ),
+        }) as directory:
+            tests = import_module('model_change.tests')
+            result = run_tests(
+                tests.ThingTests,
+                dependency_tracer=DependencyTracer(directory))[0]
+            test = tests.ThingTests('test_colour')
+            dependencies = result.dependencies[test.id()]
+            before = test_fingerprint(test, dependencies, FileHasher())
+
+            result_cache = ResultCache(
+                os.path.join(directory, 'history.sqlite3'), 10)
+            result_cache.record(result.outcomes(), {test.id(): before})
+            self.assertEqual(result_cache.passed({test.id(): before}),
+                             set([test.id()]))
+
+            with open(os.path.join('model_change', 'models.py'), 'w') as f:
+                f.write("class Thing(object):\n    colour = 'blue'\n")
+            after = test_fingerprint(test, dependencies, FileHasher())
+            self.assertNotEqual(after, before)
+            self.assertEqual(result_cache.passed({test.id(): after}), set())
+            result_cache.close()
+
+
+class DiscoveryIndexTests(SimpleTestCase):
+
+    def discover(self, directory, patterns):
+        "Discover the tests matching the patterns, using the index."
+        loader = JunoTestLoader()
+        loader.testNamePatterns = patterns
+        loader.discovery_index = DiscoveryIndex(
+            os.path.join(directory, 'history.sqlite3'))
+        try:
+            suite = loader.discover(
+                os.path.join(directory, 'indexed'), top_level_dir=directory)
+        finally:
+            loader.discovery_index.close()
+        for module_name in list(sys.modules):
+            # as if each discovery were another run
+            if module_name.startswith('indexed.'):
+                del sys.modules[module_name]
+        return [test.id() for test in iter_tests(suite)]
+
+    def test_a_change_to_an_imported_mixin_invalidates_the_index(self):
+        with temporary_package('indexed', {
+            'mixins.py': (
+                "class Mixin(object):\n"
+                "    def test_old(self):\n        pass\n"
+            ),
+            'test_things.py': (
+                "import unittest\n\n"
+                "from indexed.mixins import Mixin\n\n\n"
+                "class Things(Mixin, unittest.TestCase):\n    pass\n"
+            ),
+        }) as directory:
+            self.assertEqual(self.discover(directory, ['*old*']),
+                             ['indexed.test_things.Things.test_old'])
+            # nothing matches, so the indexed file isn't imported
+            self.assertEqual(self.discover(directory, ['*brand_new*']), [])
+
+            with open(os.path.join('indexed', 'mixins.py'), 'a') as mixins:
+                mixins.write("    def test_brand_new(self):\n        pass\n")
+            self.assertEqual(self.discover(directory, ['*brand_new*']),
+                             ['indexed.test_things.Things.test_brand_new'])
+
+    def test_the_start_package_load_tests_takes_over(self):
+        with temporary_package('indexed', {
+            '__init__.py': (
+                "import unittest\n\n\n"
+                "def load_tests(loader, tests, pattern):\n"
+                "    from indexed.checks import Checks\n"
+                "    tests.addTests(\n"
+                "        loader.loadTestsFromTestCase(Checks))\n"
+                "    return tests\n"
+            ),
+            'checks.py': (
+                "import unittest\n\n\n"
+                "class Checks(unittest.TestCase):\n"
+                "    def test_check(self):\n        pass\n"
+            ),
+            'test_ignored.py': (
+                "import unittest\n\n\n"
+                "class Ignored(unittest.TestCase):\n"
+                "    def test_check(self):\n        pass\n"
+            ),
+        }) as directory:
+            for _ in range(2):
+                self.assertEqual(self.discover(directory, ['*check*']),
+                                 ['indexed.checks.Checks.test_check'])
+
+
+class FailureGroupTests(SimpleTestCase):
+
+    def test_groups_failures_by_message_as_well_as_traceback(self):
+        def check(test, value):
+            test.assertEqual(value, 1)
+
+        class SharedHelper(unittest.TestCase):
+            def test_a(self):
+                check(self, 2)
+
+            def test_b(self):
+                check(self, 2)
+
+            def test_c(self):
+                check(self, 3)
+
+        # just the helper's frame, which all three fail in
+        result, output = run_tests(SharedHelper, result_settings={
+            'GROUP_FAILURES': True,
+            'FAILURE_SIGNATURE_DEPTH': 1,
+        })
+        self.assertEqual(len(result.failures), 3)
+        self.assertEqual(len(result.failure_groups), 2)
+        self.assertIn("2 != 1", output)
+        self.assertIn("3 != 1", output)
+        self.assertIn("... and 1 more tests with the same traceback", output)
+
+        # the grouped failure points back to the first, with its message
+        grouped = dict(
+            (test.id(), text) for test, text in result.failures
+        )[SharedHelper('test_b').id()]
+        self.assertEqual(grouped.splitlines(), [
+            "Same traceback as %s (2 tests so far)" % (
+                SharedHelper('test_a').id()),
+            "AssertionError: 2 != 1",
+        ])
+
+    def test_does_not_group_failures_unless_asked_to(self):
+        class Repeated(unittest.TestCase):
+            def test_a(self):
+                self.fail("same")
+
+            def test_b(self):
+                self.fail("same")
+
+        result = run_tests(Repeated)[0]
+        self.assertEqual(result.failure_groups, {})
+        for _, text in result.failures:
+            self.assertIn("Traceback", text)
+
+
+class SlowTestReportTests(SimpleTestCase):
+
+    def test_push_bounded_keeps_the_largest_items(self):
+        items = list(range(100))
+        random.Random(0).shuffle(items)
+        heap = []
+        for item in items:
+            push_bounded(heap, item, 5)
+            self.assertLessEqual(len(heap), 5)
+            self.assertEqual(heap[0], min(heap))
+        self.assertEqual(sorted(heap), [95, 96, 97, 98, 99])
+
+    def test_aggregates_the_time_of_classes_and_modules(self):
+        tests = make_cases([2, 1])
+        result = TextTestResult(_WritelnDecorator(StringIO()), False, 0,
+                                total_tests=3, slow_test_count=2)
+        for test, elapsed in zip(tests, (0.3, 0.1, 0.2)):
+            result._record_timing(test, elapsed)
+
+        self.assertEqual(
+            [(slow.name, slow.elapsed) for slow in result.slow_tests],
+            [(tests[0].id(), 0.3), (tests[2].id(), 0.2)])
+        self.assertEqual(
+            [(slow.name, round(slow.elapsed, 6))
+             for slow in result.slow_classes],
+            [(tests[0].id().rsplit('.', 1)[0], 0.4),
+             (tests[2].id().rsplit('.', 1)[0], 0.2)])
+        self.assertEqual(
+            [(slow.name, round(slow.elapsed, 6))
+             for slow in result.slow_modules],
+            [(__name__, 0.6)])
+
+
+class EstimatedTimeTests(SimpleTestCase):
+
+    def test_estimates_from_the_recorded_durations(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        seen, slow_seen, unseen = make_cases([3])
+        history = DurationHistory(os.path.join(directory, 'history.sqlite3'))
+        self.addCleanup(history.close)
+        history.record({seen.id(): 10.0, slow_seen.id(): 20.0,
+                        'app.tests.Gone.test_gone': 40.0})
+
+        runner = TextTestRunner(stream=StringIO(), history=history,
+                                total_tests=3)
+        suite = unittest.TestSuite([seen, slow_seen, unseen])
+        result = runner._makeResult(runner._expected_durations(suite))
+        result.start_time = time.time()
+        # the test never seen before is guessed at from the others so far
+        self.assertAlmostEqual(result._estimated_time, 30.0, delta=1.0)
+
+        result._update_estimate(seen.id(), 9.0)
+        self.assertAlmostEqual(result._estimated_time, 20.0, delta=1.0)
+        # then from the tests never seen before that have run
+        result._update_estimate(unseen.id(), 0.5)
+        self.assertEqual(result._estimated_time, 20.0)
+        result._update_estimate(slow_seen.id(), 25.0)
+        self.assertEqual(result._estimated_time, 0)
+
+
+class RegressionTests(SimpleTestCase):
+
+    def run_slower(self, **kwargs):
+        class Slower(unittest.TestCase):
+            def test_sleeps(self):
+                time.sleep(0.01)
+
+        baseline = Baseline({Slower('test_sleeps').id(): 0.001}, 1.5, 0.0)
+        return run_tests(Slower, baseline=baseline, **kwargs)
+
+    def test_lists_slower_tests_without_failing(self):
+        result, output = self.run_slower()
+        self.assertEqual(len(result.regressions), 1)
+        self.assertIn(" OK ", output)
+        self.assertIn("slower=1", output)
+
+    def test_fails_the_run_on_regression(self):
+        output = self.run_slower(fail_on_regression=True)[1]
+        self.assertNotIn(" OK ", output)
+        self.assertIn(" FAILED ", output)
+        self.assertIn("regressions=1", output)
+
+
+class EventLogTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'events.ndjson')
+
+    def logged_events(self):
+        with open(self.path) as log:
+            return [json.loads(line)['event'] for line in log]
+
+    def test_writes_events_out_without_waiting_for_another(self):
+        event_log = EventLog(self.path, flush_interval=0.01)
+        self.addCleanup(event_log.close)
+        event_log.write('startTest', test='hangs')
+        deadline = time.time() + 5
+        while not self.logged_events() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.logged_events(), ['startTest'])
+
+    def test_writes_errors_and_failures_out_at_once(self):
+        event_log = EventLog(self.path, flush_interval=60)
+        self.addCleanup(event_log.close)
+        event_log.write('startTest', test='fails')
+        self.assertEqual(self.logged_events(), [])
+        event_log.write('outcome', test='fails', outcome='failure')
+        self.assertEqual(self.logged_events(), ['startTest', 'outcome'])
+
+    def test_a_failing_subtest_is_the_outcome_of_its_test(self):
+        class Subtests(unittest.TestCase):
+            def test_numbers(self):
+                for i in range(3):
+                    with self.subTest(i=i):
+                        self.assertNotEqual(i, 1)
+
+        run_tests(Subtests,
+                  result_settings={'EVENT_LOG_FILE_NAME': self.path})
+        with open(self.path) as log:
+            events = [json.loads(line) for line in log]
+        test_id = Subtests('test_numbers').id()
+        outcome, stop = [
+            event for event in events
+            if event['event'] in ('outcome', 'stopTest')
+        ]
+        self.assertEqual(outcome['test'], test_id)
+        self.assertEqual(outcome['outcome'], 'failure')
+        self.assertEqual(outcome['subtest'], '(i=1)')
+        self.assertIn('AssertionError', outcome['traceback'])
+        self.assertEqual(stop['test'], test_id)
+        self.assertEqual(stop['outcome'], 'failure')
+
+
+class RetryTests(SimpleTestCase):
+
+    def test_counts_a_test_that_passes_on_retry_as_flaky(self):
+        class PassesSecondTime(unittest.TestCase):
+            attempts = []
+
+            def test_flaky(self):
+                self.attempts.append(None)
+                self.assertGreater(len(self.attempts), 1)
+
+            def test_passes(self):
+                pass
+
+        result, output = run_tests(PassesSecondTime, retries=1)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(result.flaky_count, 1)
+        self.assertIn("Flaky: 1", output)
+        self.assertIn(" (flaky=1)", output)
+
+
+class StatusLineTests(SimpleTestCase):
+
+    def test_redraws_until_stopped(self):
+        stream = StringIO()
+        renders = []
+
+        def render():
+            renders.append(None)
+            return "%i tests" % len(renders)
+
+        self.assertFalse(StatusLine.supported(stream))
+        status_line = StatusLine(stream, render, 0.01)
+        status_line.start()
+        deadline = time.time() + 5
+        while len(renders) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        with status_line.paused():
+            stream.write("FAIL\n")
+        status_line.stop()
+
+        self.assertFalse(status_line._thread.is_alive())
+        self.assertIn(CLEAR_LINE + "1 tests" + CLEAR_LINE + "2 tests",
+                      stream.getvalue())
+        # the line is cleared for other output, and not left behind once
+        # it's stopped
+        self.assertIn(CLEAR_LINE + "FAIL\n", stream.getvalue())
+        self.assertTrue(stream.getvalue().endswith(CLEAR_LINE) or
+                        stream.getvalue().endswith("FAIL\n"))
+        drawn = len(renders)
+        time.sleep(0.05)
+        self.assertEqual(len(renders), drawn)
+
+
+class MemoryProfilerTests(SimpleTestCase):
+
+    def setUp(self):
+        if tracemalloc.is_tracing():
+            self.skipTest("the run's own --memory is tracing allocations")
+
+    def test_tells_retained_memory_from_the_peak(self):
+        held = []
+
+        class Allocating(unittest.TestCase):
+            def test_holds_on(self):
+                held.append(bytearray(1024 * 1024))
+
+            def test_lets_go(self):
+                bytearray(2 * 1024 * 1024)
+
+        result, output = run_tests(Allocating,
+                                   memory_profiler=MemoryProfiler())
+        self.assertFalse(tracemalloc.is_tracing())
+
+        stats = dict((entry.name, entry) for entry in result.most_retained)
+        holds_on = stats[Allocating('test_holds_on').id()]
+        self.assertGreaterEqual(holds_on.retained, 1024 * 1024)
+        self.assertEqual(result.most_retained[0], holds_on)
+        lets_go = stats.get(Allocating('test_lets_go').id())
+        if lets_go is not None:
+            self.assertLess(lets_go.retained, 1024 * 1024)
+            if lets_go.peak is not None:
+                self.assertGreaterEqual(lets_go.peak, 2 * 1024 * 1024)
+
+        self.assertIn("Most memory retained: ", output)
+        self.assertIn("%s : %s retained" % (
+            holds_on.name, format_size(holds_on.retained)), output)
+        self.assertEqual(result.modules_retained[0][0], __name__)
+
+
+class QueryRecorderTests(TestCase):
+
+    def test_normalise_takes_out_the_literals(self):
+        self.assertEqual(
+            normalise("SELECT \"t1\".\"id\" FROM \"t1\"\n"
+                      "  WHERE \"name\" = 'it''s' AND \"size\" > 12.5"
+                      "  AND \"id\" IN (1, 2, 3)"),
+            'SELECT "t1"."id" FROM "t1" WHERE "name" = ? AND "size" > ? '
+            'AND "id" IN (...)')
+        self.assertEqual(normalise("SELECT 1 WHERE x IN ('a', 'b')"),
+                         normalise("SELECT 2 WHERE x IN ('c')"))
+
+    def test_counts_the_queries_between_start_and_stop(self):
+        from django.contrib.auth.models import Group
+        from django.db import connection
+
+        recorder = QueryRecorder()
+        recorder.start()
+        for pk in range(3):
+            list(Group.objects.filter(pk=pk))
+        Group.objects.count()
+        stats = recorder.stop('a test')
+
+        self.assertEqual((stats.name, stats.count), ('a test', 4))
+        self.assertEqual(len(stats.repeated), 1)
+        statement, count = stats.repeated[0]
+        self.assertEqual(count, 3)
+        self.assertIn('WHERE "auth_group"."id" = %s', statement)
+
+        # the wrapper is gone, and with it the counting
+        self.assertNotIn(recorder, connection.execute_wrappers)
+        Group.objects.count()
+        self.assertEqual(recorder.count, 4)
+
+
+class ImportProfilerTests(SimpleTestCase):
+
+    def test_reports_the_imports_and_gives_the_loaders_back(self):
+        with temporary_package('profiled', {
+            'slow.py': "import time\n\ntime.sleep(0.02)\n",
+            'tests.py': "import profiled.slow  # noqa\n",
+        }):
+            profiler = ImportProfiler()
+            profiler.start()
+            try:
+                import_module('profiled.tests')
+            finally:
+                output = StringIO()
+                with redirect_stdout(output):
+                    TestSuiteRunner().report_imports(profiler)
+            loader = sys.modules['profiled.slow'].__spec__.loader
+
+        self.assertNotIn(profiler, sys.meta_path)
+        self.assertNotIn('exec_module', vars(loader))
+        self.assertEqual(profiler.slowest(1)[0].name, 'profiled.tests')
+        self.assertIn("profiled.slow (pulled in by profiled.tests)",
+                      output.getvalue())
+        self.assertGreaterEqual(
+            dict(profiler.slowest_roots(10))['profiled.tests'], 0.02)
+
+
+class SchemaFingerprintTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+
+    def test_covers_the_migration_files(self):
+        self.assertIn(
+            os.path.join('auth', 'migrations', '0001_initial.py'),
+            '\n'.join(schema_files()))
+
+    def test_a_changed_migration_changes_the_fingerprint(self):
+        migration = os.path.join(self.directory, '0001_initial.py')
+        with open(migration, 'w') as source:
+            source.write("operations = []\n")
+        with mock.patch('junorunner.databases.schema_files',
+                        return_value=set([migration])):
+            before = schema_fingerprint()
+            self.assertEqual(schema_fingerprint(), before)
+            with open(migration, 'a') as source:
+                source.write("operations.append(None)\n")
+            self.assertNotEqual(schema_fingerprint(), before)
+
+    def test_the_store_keeps_the_last_fingerprint(self):
+        store = SchemaStore(os.path.join(self.directory, 'history.sqlite3'))
+        self.addCleanup(store.close)
+        self.assertEqual(store.get(), (None, None))
+        store.set('abc', 1.5)
+        store.set('def', 2.5)
+        self.assertEqual(store.get(), ('def', 2.5))
+
+    def setup_databases(self, fingerprint):
+        """
+        Set up the databases, as far as deciding whether to keep them, for
+        a schema with the given fingerprint. Return whether they were kept.
+        """
+        runner = JunoDiscoverRunner(keepdb=True, verbosity=0)
+        runner.HISTORY_FILE_NAME = os.path.join(
+            self.directory, 'history.sqlite3')
+        kept = []
+
+        def setup_databases(runner, **kwargs):
+            kept.append((runner.keepdb, runner.interactive))
+
+        with mock.patch.object(DiscoverRunner, 'setup_databases',
+                               setup_databases), \
+                mock.patch('junorunner.databases.schema_fingerprint',
+                           return_value=fingerprint):
+            runner.setup_databases()
+        keepdb, interactive = kept[0]
+        # the databases in the way of a rebuild are ours to replace
+        self.assertEqual(interactive, keepdb)
+        return keepdb
+
+    def test_reuses_the_databases_only_for_the_same_schema(self):
+        self.assertFalse(self.setup_databases('abc'))
+        self.assertTrue(self.setup_databases('abc'))
+        self.assertFalse(self.setup_databases('def'))
+        self.assertTrue(self.setup_databases('def'))
+
+
+class LastFailedTests(SimpleTestCase):
+
+    failed = [
+        'test_app.tests.JunorunnerTransactionTestCase'
+        '.test_can_run_transaction_bound_tests',
+        'test_app.tests.JunorunnerTestCase.test_counts_tests_correctly',
+        'test_app.tests.DependencyTests'
+        '.test_project_file_rejects_names_that_are_not_files',
+    ]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'test_rerun.txt')
+        with open(path, 'w') as rerun_log:
+            rerun_log.write('\n'.join(self.failed) + '\n\n')
+        patcher = mock.patch.object(
+            TextTestResult, 'RERUN_LOG_FILE_NAME', path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_the_names_of_the_failed_tests(self):
+        self.assertEqual(JunoTestLoader().getLastFailedNames(), self.failed)
+
+    def test_runs_the_failed_tests_first_within_their_type(self):
+        tests = [
+            JunorunnerTestCase('test_can_run_tests'),
+            JunorunnerTestCase('test_counts_tests_correctly'),
+            JunorunnerTransactionTestCase(
+                'test_can_run_transaction_bound_tests'),
+            DependencyTests(
+                'test_records_the_modules_a_test_module_imports_from'),
+        ]
+        ordered = JunoTestLoader().sortFailedFirst(
+            tests, (TestCase, TransactionTestCase))
+        self.assertEqual([test.id() for test in ordered], [
+            'test_app.tests.JunorunnerTestCase.test_counts_tests_correctly',
+            'test_app.tests.JunorunnerTestCase.test_can_run_tests',
+            'test_app.tests.JunorunnerTransactionTestCase'
+            '.test_can_run_transaction_bound_tests',
+            'test_app.tests.DependencyTests'
+            '.test_records_the_modules_a_test_module_imports_from',
+        ])
+
+    def test_keeps_just_the_failed_tests_the_labels_take_in(self):
+        runner = JunoDiscoverRunner(verbosity=0)
+        runner.last_failed_names = runner.test_loader.getLastFailedNames()
+        suite = runner.build_suite([
+            'test_app.tests.JunorunnerTestCase',
+            'test_app.tests.JunorunnerTransactionTestCase',
+        ])
+        self.assertEqual(
+            sorted(test.id() for test in iter_tests(suite)),
+            sorted(self.failed[:2]))
+
+
+class WatchTests(SimpleTestCase):
+
+    def rerun_labels(self, test_labels):
+        "Return the labels rerun after a change to the test module."
+        with temporary_package('watched', {
+            'tests.py': (
+                "import unittest\n\n\n"
+                "class Ok(unittest.TestCase):\n"
+                "    def test_ok(self):\n        pass\n\n\n"
+                "class Other(unittest.TestCase):\n"
+                "    def test_other(self):\n        pass\n"
+            ),
+        }):
+            import_module('watched.tests')
+            test_ids = set(['watched.tests.Ok.test_ok'])
+            if 'watched.tests.Ok' not in test_labels:
+                test_ids.add('watched.tests.Other.test_other')
+            return JunoDiscoverRunner().watched_labels(
+                set([os.path.join('watched', 'tests.py')]),
+                test_labels,
+                test_ids
+            )
+
+    def test_reruns_just_the_watched_class_of_a_changed_module(self):
+        self.assertEqual(self.rerun_labels(['watched.tests.Ok']),
+                         ['watched.tests.Ok'])
+
+    def test_reruns_a_changed_module_being_watched(self):
+        self.assertEqual(self.rerun_labels(['watched']), ['watched.tests'])
+        self.assertEqual(self.rerun_labels(['.']), ['watched.tests'])
+
+
+class SlowTestProfilerTests(SimpleTestCase):
+
+    def profiled(self, profiler, name):
+        profiler.start()
+        sorted(range(100))
+        return SlowTest(0.1, name, profiler.stop())
+
+    def test_replaces_only_the_profiles_it_wrote(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'mine.pstats'), 'w'):
+            pass
+
+        profiler = SlowTestProfiler(directory)
+        profiler.write([self.profiled(profiler, 'app.tests.A.test_a')])
+        profiler.write([self.profiled(profiler, 'app.tests.B.test_b')])
+        self.assertEqual(sorted(os.listdir(directory)), [
+            '.junorunner-profiles',
+            'app.tests.B.test_b.pstats',
+            'merged.pstats',
+            'mine.pstats',
+        ])
+
+
+class ClassSetupTimerTests(TestCase):
+
+    def test_times_each_phase_without_those_nested_in_it(self):
+        class Base(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                time.sleep(0.01)
+                cls.setUpTestData()
+
+            @classmethod
+            def setUpTestData(cls):
+                time.sleep(0.05)
+
+        class Timed(Base):
+            @classmethod
+            def setUpClass(cls):
+                super(Timed, cls).setUpClass()
+
+            def test_nothing(self):
+                pass
+
+        timer = ClassSetupTimer()
+        timer.install([Base, Timed])
+        try:
+            self.assertIsNot(Timed.__dict__['setUpClass'],
+                             Base.__dict__['setUpClass'])
+            run_tests(Timed)
+        finally:
+            timer.uninstall()
+
+        name = '%s.Timed' % __name__
+        setup = timer.phase_times[name + '.setUpClass']
+        test_data = timer.phase_times[name + '.setUpTestData']
+        self.assertGreaterEqual(test_data, 0.05)
+        self.assertGreaterEqual(setup, 0.01)
+        self.assertLess(setup, 0.05)
+        self.assertEqual(
+            [phase for phase, _ in timer.take(name)],
+            ['setUpTestData', 'setUpClass'])
+        self.assertEqual(timer.take(name), [])
+
+        # the originals are back, and Timed inherits tearDownClass again
+        self.assertNotIn('tearDownClass', Timed.__dict__)
+        times = dict(timer.phase_times)
+        Timed.setUpClass()
+        self.assertEqual(timer.phase_times, times)
+
+    def test_times_each_fixture_file(self):
+        directories = [tempfile.mkdtemp(prefix='junorunner-tests-')
+                       for _ in range(2)]
+        for number, directory in enumerate(directories, 1):
+            self.addCleanup(shutil.rmtree, directory)
+            with open(os.path.join(directory, 'groups.json'), 'w') as out:
+                json.dump([{'model': 'auth.group', 'pk': number,
+                            'fields': {'name': 'group %i' % number}}], out)
+
+        timer = ClassSetupTimer()
+        timer.install([])
+        try:
+            with self.settings(FIXTURE_DIRS=directories):
+                call_command('loaddata', 'groups', verbosity=0)
+                call_command('loaddata', 'groups', verbosity=0)
+        finally:
+            timer.uninstall()
+
+        paths = [os.path.relpath(os.path.join(directory, 'groups.json'))
+                 for directory in directories]
+        self.assertEqual(sorted(timer.fixture_loads.items()),
+                         sorted((path, 2) for path in paths))
+        self.assertEqual(timer.stack, [])
+
+
+class FixtureCacheTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+
+    def write_fixture(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as fixture:
+            fixture.write(content)
+        return path
+
+    def group_fixture(self, name, pk):
+        return self.write_fixture(name, json.dumps([{
+            'model': 'auth.group', 'pk': pk, 'fields': {'name': name},
+        }]))
+
+    def cache(self, file_bytes):
+        "A cache of at most file_bytes, as the runner makes one."
+        runner = JunoDiscoverRunner()
+        runner.cache_fixtures = True
+        runner.FIXTURE_CACHE_FILE_BYTES = file_bytes
+        cache = runner.get_fixture_cache()
+        cache.install()
+        self.addCleanup(cache.uninstall)
+        return cache
+
+    def test_parses_each_file_once(self):
+        from django.contrib.auth.models import Group
+
+        path = self.group_fixture('one.json', 1)
+        cache = self.cache(1024 * 1024)
+        call_command('loaddata', path, verbosity=0)
+        Group.objects.all().delete()
+        call_command('loaddata', path, verbosity=0)
+
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        # the models are still built and saved from the cached contents
+        self.assertEqual(
+            list(Group.objects.values_list('name', flat=True)),
+            ['one.json'])
+
+    def test_evicts_the_least_recently_used_files_over_the_limit(self):
+        one = self.group_fixture('one.json', 1)
+        two = self.group_fixture('two.json', 2)
+        too_big = self.write_fixture(
+            'too_big.json', '[%s]' % (' ' * os.path.getsize(one)))
+        cache = self.cache(os.path.getsize(one) + 1)
+
+        call_command('loaddata', one, verbosity=0)
+        call_command('loaddata', two, verbosity=0)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual([key[0] for key in cache.entries],
+                         [os.path.abspath(two)])
+
+        call_command('loaddata', one, verbosity=0)
+        self.assertEqual((cache.misses, cache.hits), (3, 0))
+
+        # a file bigger than the whole cache isn't kept at all, rather
+        # than evicting everything else
+        with self.assertWarns(RuntimeWarning):
+            call_command('loaddata', too_big, verbosity=0)
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual([key[0] for key in cache.entries],
+                         [os.path.abspath(one)])
+
+    def test_uninstall_restores_the_deserializer_after_an_error(self):
+        from django.core import serializers
+        from django.core.management.base import CommandError
+        from django.core.serializers.base import DeserializationError
+
+        deserialize = serializers.deserialize
+        broken = self.write_fixture('broken.json', '[{"model": ')
+        cache = self.cache(1024 * 1024)
+        try:
+            # Django's own parser reports the error
+            with self.assertRaises((CommandError, DeserializationError)):
+                call_command('loaddata', broken, verbosity=0)
+        finally:
+            cache.uninstall()
+        self.assertIs(serializers.deserialize, deserialize)
+        self.assertEqual(cache.misses, 0)
+
+
+class JUnitWriterTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = directory
+        self.path = os.path.join(directory, 'junit.xml')
+
+    def make_testcase(self, name, failure=None):
+        testcase = ElementTree.Element('testcase', name=name, time='0.001')
+        if failure is not None:
+            ElementTree.SubElement(testcase, 'failure').text = failure
+        return testcase
+
+    def test_is_a_complete_document_before_it_is_closed(self):
+        writer = JUnitWriter(self.path, 'Suite', interval=0)
+        self.addCleanup(writer.file.close)
+        self.assertEqual(ElementTree.parse(self.path).getroot().get('tests'),
+                         '0')
+
+        # enough tests for the counts to grow by several digits, and text
+        # that has to be escaped
+        for number in range(1, 1001):
+            writer.write_testcase(
+                self.make_testcase(
+                    'test_%i' % number,
+                    failure="<&> \u2603" if number % 2 else None),
+                errors=0, failures=(number + 1) // 2, skips=0,
+                tests=number, time=number * 0.001)
+            if number in (1, 9, 10, 99, 100, 1000):
+                root = ElementTree.parse(self.path).getroot()
+                self.assertEqual(root.get('tests'), str(number))
+                self.assertEqual(root.get('failures'),
+                                 str((number + 1) // 2))
+                self.assertEqual(len(root.findall('testcase')), number)
+        self.assertEqual(root.find('testcase/failure').text, "<&> \u2603")
+
+    def test_holds_passing_tests_until_the_interval_has_passed(self):
+        writer = JUnitWriter(self.path, 'Suite', interval=60)
+        writer.write_testcase(self.make_testcase('test_passes'),
+                              errors=0, failures=0, skips=0, tests=1,
+                              time=0.001)
+        root = ElementTree.parse(self.path).getroot()
+        self.assertEqual(root.get('tests'), '0')
+        self.assertEqual(root.findall('testcase'), [])
+
+        # a failure is written straight away, with everything before it
+        writer.write_testcase(self.make_testcase('test_fails', "bad"),
+                              errors=0, failures=1, skips=0, tests=2,
+                              time=0.002)
+        writer.write_testcase(self.make_testcase('test_passes_too'),
+                              errors=0, failures=1, skips=0, tests=3,
+                              time=0.003)
+        root = ElementTree.parse(self.path).getroot()
+        self.assertEqual(root.get('tests'), '2')
+        self.assertEqual(
+            [testcase.get('name') for testcase in root.findall('testcase')],
+            ['test_passes', 'test_fails'])
+
+        writer.close(errors=0, failures=1, skips=0, tests=3, time=0.003)
+        root = ElementTree.parse(self.path).getroot()
+        self.assertEqual(root.get('tests'), '3')
+        self.assertEqual(len(root.findall('testcase')), 3)
+
+    def test_rejects_attributes_too_long_for_the_header(self):
+        with self.assertRaises(ValueError):
+            JUnitWriter(self.path, 'x' * 300)
+
+    def test_a_run_cut_short_leaves_a_complete_document(self):
+        class CutShort(unittest.TestCase):
+            def test_fails(self):
+                self.fail("<bad & worse>")
+
+            def test_passes(self):
+                pass
+
+        class JUnitResult(TextTestResult):
+            RERUN_LOG_FILE_NAME = os.path.join(self.directory, 'rerun.txt')
+            FAILURE_LIST_FILENAME = os.path.join(
+                self.directory, 'failures.txt')
+            JUNIT_FILE = self.path
+            JUNIT_XML_INTERVAL = 0
+            EVENT_LOG_FILE_NAME = None
+            STATUS_LINE = False
+
+        result = JUnitResult(_WritelnDecorator(StringIO()), False, 1,
+                             total_tests=2)
+        result.startTestRun()
+        unittest.defaultTestLoader.loadTestsFromTestCase(CutShort)(result)
+        # no stopTestRun, as if the run had been killed here
+        try:
+            root = ElementTree.parse(self.path).getroot()
+        finally:
+            result.junit.file.close()
+            result.closeLogFiles()
+
+        self.assertEqual(root.get('tests'), '2')
+        self.assertEqual(root.get('failures'), '1')
+        self.assertEqual(root.get('errors'), '0')
+        testcases = root.findall('testcase')
+        self.assertEqual([testcase.get('name') for testcase in testcases],
+                         ['test_fails', 'test_passes'])
+        self.assertIn("<bad & worse>",
+                      testcases[0].find('failure').get('message'))
+
+    def test_failing_subtests_and_class_errors_are_written(self):
+        class Subtests(unittest.TestCase):
+            def test_numbers(self):
+                for i in range(4):
+                    with self.subTest(i=i):
+                        self.assertLess(i, 2)
+
+            def test_passes(self):
+                pass
+
+        class BrokenSetup(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                raise RuntimeError("no setup")
+
+            def test_never_runs(self):
+                pass
+
+        result, _ = run_tests(
+            unittest.TestSuite([
+                unittest.defaultTestLoader.loadTestsFromTestCase(case)
+                for case in (Subtests, BrokenSetup)
+            ]),
+            result_settings={'JUNIT_FILE': self.path},
+        )
+
+        root = ElementTree.parse(self.path).getroot()
+        testcases = root.findall('testcase')
+        self.assertEqual(root.get('tests'), str(len(testcases)))
+        self.assertEqual(root.get('failures'), '2')
+        self.assertEqual(root.get('errors'), '1')
+        self.assertEqual(
+            [testcase.get('name') for testcase in testcases[:3]],
+            ['test_numbers (i=2)', 'test_numbers (i=3)', 'test_passes'])
+        self.assertTrue(testcases[3].get('name').startswith('setUpClass ('))
+        self.assertEqual(testcases[0].get('classname'),
+                         '%s.Subtests' % __name__)
+        self.assertEqual(testcases[3].get('time'), '0.000000')
+
+
+def make_cases(sizes):
+    """
+    Return the tests of a TestCase class for each size, with that many
+    tests in it.
+    """
+    tests = []
+    for number, size in enumerate(sizes):
+        methods = dict(
+            ('test_%i' % index, lambda self: None) for index in range(size))
+        case = type(str('Case%i' % number), (unittest.TestCase,), methods)
+        tests.extend(case(name) for name in sorted(methods))
+    return tests
+
+
+class PartitionTests(SimpleTestCase):
+
+    def test_balances_the_classes_by_duration(self):
+        # one test a class, weighing 5, 4, 3, 3, 2 and 1 seconds
+        tests = make_cases([1] * 6)
+        durations = dict(
+            (test.id(), duration)
+            for test, duration in zip(tests, [5, 4, 3, 3, 2, 1]))
+        partitions = partition_tests(tests, 2, durations)
+        self.assertEqual([partition.predicted for partition in partitions],
+                         [9, 9])
+        # each keeps its classes in the order they came in
+        for partition in partitions:
+            self.assertEqual(
+                partition.tests,
+                [test for test in tests if test in partition.tests])
+
+    def test_splits_by_test_count_without_history(self):
+        partitions = partition_tests(make_cases([4, 2, 2]), 2, {})
+        self.assertEqual([len(partition.tests) for partition in partitions],
+                         [4, 4])
+
+    def test_is_the_same_however_the_history_was_read(self):
+        tests = make_cases([3, 1, 4, 1, 5, 9, 2, 6])
+        durations = dict(
+            (test.id(), (index * 7 % 10) / 10.0)
+            for index, test in enumerate(tests))
+        shuffled = list(durations.items())
+        random.Random(0).shuffle(shuffled)
+
+        def test_ids(tests, durations):
+            return [[test.id() for test in partition.tests]
+                    for partition in partition_tests(tests, 3, durations)]
+
+        self.assertEqual(test_ids(tests, durations),
+                         test_ids(list(tests), dict(shuffled)))
+
+    def test_shards_cover_the_suite_once(self):
+        tests = make_cases([3, 1, 4, 1, 5])
+        shards = [shard_tests(tests, index, 3, {}) for index in (1, 2, 3)]
+        self.assertEqual(
+            sorted(test.id() for shard in shards for test in shard),
+            sorted(test.id() for test in tests))
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('2/8'), (2, 8))
+        for value in ('', '2', '2/', '/8', 'a/b', '1/2/3', '0/8', '9/8',
+                      '-1/8', '1/0'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+
+class MergeShardsTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='junorunner-tests-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.shards = []
+        for shard in ('1', '2'):
+            os.mkdir(os.path.join(directory, shard))
+            self.shards.append(os.path.join(directory, shard))
+        self.merged = os.path.join(directory, 'merged')
+        os.mkdir(self.merged)
+        self.command = MergeShards(stdout=StringIO(), stderr=StringIO())
+
+    def test_merges_junit_xml(self):
+        for shard, names in zip(self.shards, (['a', 'b'], ['c'])):
+            writer = JUnitWriter(os.path.join(shard, 'junit.xml'), 'Shard')
+            for number, name in enumerate(names, 1):
+                testcase = ElementTree.Element(
+                    'testcase', name=name, time='0.500')
+                if name == 'b':
+                    ElementTree.SubElement(testcase, 'failure')
+                writer.write_testcase(
+                    testcase, errors=0, failures=int(name == 'b'), skips=0,
+                    tests=number, time=number * 0.5)
+            writer.close(errors=0, failures=int(len(names) > 1), skips=0,
+                         tests=len(names), time=len(names) * 0.5)
+
+        path = os.path.join(self.merged, 'junit.xml')
+        self.command.merge_junit(self.shards, path)
+        root = ElementTree.parse(path).getroot()
+        self.assertEqual(
+            [testcase.get('name') for testcase in root.iter('testcase')],
+            ['a', 'b', 'c'])
+        self.assertEqual(
+            dict((key, root.get(key))
+                 for key in ('tests', 'failures', 'errors', 'time')),
+            {'tests': '3', 'failures': '1', 'errors': '0', 'time': '1.500'})
+
+    def test_merges_the_rerun_logs(self):
+        for shard, names in zip(self.shards, (['a.A.test_a\n'],
+                                              ['b.B.test_b\n'])):
+            with open(os.path.join(shard, 'test_rerun.txt'), 'w') as log:
+                log.writelines(names)
+        path = os.path.join(self.merged, 'test_rerun.txt')
+        self.command.merge_lines(self.shards, path)
+        with open(path) as log:
+            self.assertEqual(log.read().split(), ['a.A.test_a', 'b.B.test_b'])
+
+    def test_merges_the_histories_keeping_the_latest_durations(self):
+        path = os.path.join(self.merged, 'history.sqlite3')
+        history = DurationHistory(path)
+        history.record({'a.A.test_a': 5.0, 'c.C.test_c': 3.0})
+        history.close()
+        for shard, durations in zip(self.shards, ({'a.A.test_a': 1.0},
+                                                  {'b.B.test_b': 2.0})):
+            shard_history = DurationHistory(
+                os.path.join(shard, 'history.sqlite3'))
+            shard_history.record(durations)
+            shard_history.close()
+
+        self.command.merge_history(self.shards, path)
+        history = DurationHistory(path)
+        self.assertEqual(history.durations(), {
+            'a.A.test_a': 1.0, 'b.B.test_b': 2.0, 'c.C.test_c': 3.0})
+        # the shards ran from a copy of the history, so their samples
+        # carry on from it
+        self.assertEqual(history.samples()['a.A.test_a'], [1.0])
+        history.close()
+
+
+def init_worker_without_databases(counter):
+    pass
+
+
+class CountingDynamicTestSuite(DynamicTestSuite):
+    """
+    A dynamic suite whose workers leave the test databases alone, counting
+    the workers it starts.
+    """
+    init_worker = init_worker_without_databases
+
+    def start_worker(self, worker_id):
+        self.started = getattr(self, 'started', 0) + 1
+        return super(CountingDynamicTestSuite, self).start_worker(worker_id)
+
+
+class DynamicScheduleTests(SimpleTestCase):
+
+    def setUp(self):
+        # Django's own parallel workers are daemons, which can't fork
+        if not fork_available() or multiprocessing.current_process().daemon:
+            self.skipTest("the dynamic schedule needs to fork its workers")
+
+    def run_dynamic(self, cases, processes=2):
+        suite = CountingDynamicTestSuite([
+            unittest.defaultTestLoader.loadTestsFromTestCase(case)
+            for case in cases
+        ], processes)
+        return run_tests(suite)[0], suite
+
+    def test_runs_every_test_once_and_reports_back_to_the_parent(self):
+        cases = []
+        for number in range(5):
+            methods = dict(
+                ('test_%i' % index, lambda self: None) for index in range(3))
+            if number == 2:
+                methods['test_fails'] = lambda self: self.fail("class 2")
+            if number == 3:
+                methods['test_skips'] = lambda self: self.skipTest("class 3")
+            cases.append(type(str('Dynamic%i' % number),
+                              (unittest.TestCase,), methods))
+
+        result, suite = self.run_dynamic(cases)
+        expected = [test.id() for case in cases for test in
+                    unittest.defaultTestLoader.loadTestsFromTestCase(case)]
+        # as many tests started as there are, and every one of them stopped
+        self.assertEqual(result.testsRun, len(expected))
+        self.assertEqual(sorted(result.durations), sorted(expected))
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn("AssertionError: class 2", result.failures[0][1])
+        self.assertEqual(result.failures[0][0].id(),
+                         cases[2]('test_fails').id())
+        self.assertEqual(len(result.skipped), 1)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(suite.started, 2)
+
+    def test_a_worker_dying_fails_its_test_and_reruns_the_rest(self):
+        class Crashes(unittest.TestCase):
+            def test_1(self):
+                pass
+
+            def test_2(self):
+                os._exit(1)
+
+            def test_3(self):
+                pass
+
+            def test_4(self):
+                pass
+
+        class Survives(unittest.TestCase):
+            def test_5(self):
+                pass
+
+        result, suite = self.run_dynamic([Crashes, Survives])
+        culprit = Crashes('test_2').id()
+        self.assertEqual([test.id() for test, _ in result.errors], [culprit])
+        self.assertIn("died (exit code 1) while running this test",
+                      result.errors[0][1])
+        self.assertEqual(result.outcomes(), {
+            Crashes('test_1').id(): 'success',
+            culprit: 'error',
+            Crashes('test_3').id(): 'success',
+            Crashes('test_4').id(): 'success',
+            Survives('test_5').id(): 'success',
+        })
+        self.assertEqual(result.testsRun, 5)
+        self.assertEqual(result.failures, [])
+        # the two first workers, and one in place of the one that died
+        self.assertEqual(suite.started, 3)
+
+    def test_no_worker_replaces_one_that_dies_with_nothing_left(self):
+        class CrashesLast(unittest.TestCase):
+            def test_1(self):
+                pass
+
+            def test_2(self):
+                os._exit(1)
+
+        result, suite = self.run_dynamic([CrashesLast], processes=1)
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(suite.started, 1)